@@ -1,27 +1,208 @@
 import os
 import uuid
+from typing import Any, Callable, Optional
 
-from dotenv import load_dotenv
-from app.utils.logger import logger
+from dotenv import dotenv_values
 
-logger.info("SERVER_START: setting env file")
-load_dotenv(verbose=True)
+_env_file: Optional[dict] = None
+
+
+def _env_file_values() -> dict:
+    """Values of the .env file, read on first use without touching os.environ"""
+    global _env_file
+    if _env_file is None:
+        _env_file = dotenv_values()
+    return _env_file
 
 
 def get_value(key: str, default):
-    return str(os.environ.get(key, default))
+    """Process environment first, then the .env file, then the default"""
+    value = os.environ.get(key)
+    if value is None:
+        value = _env_file_values().get(key)
+    return str(default if value is None else value)
+
+
+def as_bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def as_list(value: str) -> list[str]:
+    """Comma separated values, blanks dropped"""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def as_int_map(value: str) -> dict[str, int]:
+    """Comma separated name=number pairs"""
+    pairs = (item.partition("=") for item in as_list(value))
+    return {name.strip(): int(number) for name, _, number in pairs}
+
+
+class EnvValue:
+    """Settings attribute read from the environment on first access, then kept"""
+
+    def __init__(self, key: str, default: Any, cast: Callable[[str], Any] = str):
+        self.key = key
+        self.default = default
+        self.cast = cast
+        self.name = key
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        value = self.cast(get_value(self.key, self.default))
+        # replaces the descriptor, later reads are plain attribute lookups
+        setattr(owner, self.name, value)
+        return value
 
 
 class DbSettings:
     """Database related settings"""
-    host = get_value("DB_HOST", "localhost")
-    port = get_value("DB_PORT", 3306)
-    dbname = get_value("DB_NAME", "postsdb")
-    user = get_value("DB_USER", "root")
-    passwd = get_value("DB_PASS", "Password@123")
+    host = EnvValue("DB_HOST", "localhost")
+    port = EnvValue("DB_PORT", 3306)
+    dbname = EnvValue("DB_NAME", "postsdb")
+    user = EnvValue("DB_USER", "root")
+    passwd = EnvValue("DB_PASS", "Password@123")
+
+    # mysql in production, sqlite (DB_NAME as file path) for local runs
+    dialect = EnvValue("DB_DIALECT", "mysql")
+    use_async = EnvValue("DB_ASYNC", False, as_bool)
+    # create missing tables and indexes on startup
+    bootstrap = EnvValue("DB_BOOTSTRAP", False, as_bool)
+
+    # connection pool
+    pool_size = EnvValue("DB_POOL_SIZE", 10, int)
+    max_overflow = EnvValue("DB_MAX_OVERFLOW", 20, int)
+    pool_recycle = EnvValue("DB_POOL_RECYCLE", 1800, int)
+    pool_timeout = EnvValue("DB_POOL_TIMEOUT", 30, int)
+    pool_pre_ping = EnvValue("DB_POOL_PRE_PING", True, as_bool)
+    # connections opened at startup, before the first request needs them
+    pool_warm = EnvValue("DB_POOL_WARM", 4, int)
+
+    # read replicas, host[:port] with the primary's credentials (mysql) or file paths (sqlite)
+    replicas = EnvValue("DB_REPLICAS", "", as_list)
+    # seconds a failing replica is left out of the rotation
+    replica_eject_seconds = EnvValue("DB_REPLICA_EJECT_SECONDS", 30, float)
+    # seconds the replicas may lag behind the primary, reads that must see the latest writes
+    # go to the primary for that long after a write
+    replica_max_lag = EnvValue("DB_REPLICA_MAX_LAG", 2, float)
+
+
+class PostSettings:
+    """Post listing related settings"""
+    list_default_limit = EnvValue("POSTS_LIST_LIMIT", 50, int)
+    list_max_limit = EnvValue("POSTS_LIST_MAX_LIMIT", 500, int)
+    stream_chunk_size = EnvValue("POSTS_STREAM_CHUNK", 500, int)
+    list_cache_control = EnvValue("POSTS_LIST_CACHE_CONTROL", "private, no-cache")
+    bulk_chunk_size = EnvValue("POSTS_BULK_CHUNK", 1000, int)
+    bulk_max_bytes = EnvValue("POSTS_BULK_MAX_BYTES", 10 * 1024 * 1024, int)
+    bulk_max_line_bytes = EnvValue("POSTS_BULK_MAX_LINE_BYTES", 64 * 1024, int)
+    delete_chunk_size = EnvValue("POSTS_DELETE_CHUNK", 500, int)
+    delete_max_ids = EnvValue("POSTS_DELETE_MAX_IDS", 10000, int)
+
+
+class SearchSettings:
+    """Post search settings"""
+    title_weight = EnvValue("SEARCH_TITLE_WEIGHT", 2.0, float)
+    default_limit = EnvValue("SEARCH_LIMIT", 20, int)
+    max_limit = EnvValue("SEARCH_MAX_LIMIT", 100, int)
+
+
+class CacheSettings:
+    """In-process cache settings"""
+    post_list_size = EnvValue("CACHE_POST_LIST_SIZE", 1024, int)
+    post_list_ttl = EnvValue("CACHE_POST_LIST_TTL", 300, int)
+    # materialized per-user post lists: users kept, and posts kept per user
+    user_feed_size = EnvValue("CACHE_USER_FEED_SIZE", 1024, int)
+    user_feed_max_posts = EnvValue("CACHE_USER_FEED_MAX_POSTS", 1000, int)
+    token_size = EnvValue("CACHE_TOKEN_SIZE", 10000, int)
+    token_ttl = EnvValue("CACHE_TOKEN_TTL", 300, int)
+
+
+class TokenSweepSettings:
+    """Background purge of expired session tokens"""
+    enabled = EnvValue("TOKEN_SWEEP_ENABLED", True, as_bool)
+    interval = EnvValue("TOKEN_SWEEP_INTERVAL", 300, float)
+    # +/- fraction of the interval, so workers started together do not sweep together
+    jitter = EnvValue("TOKEN_SWEEP_JITTER", 0.2, float)
+    batch_size = EnvValue("TOKEN_SWEEP_BATCH", 1000, int)
+    max_batches = EnvValue("TOKEN_SWEEP_MAX_BATCHES", 100, int)
+
+
+class MetricsSettings:
+    """Prometheus metrics settings"""
+    enabled = EnvValue("METRICS_ENABLED", True, as_bool)
+    path = EnvValue("METRICS_PATH", "/metrics")
+
+
+class QuerySettings:
+    """Per request SQL statement tracking"""
+    enabled = EnvValue("QUERY_TRACKING", True, as_bool)
+    slow_ms = EnvValue("QUERY_SLOW_MS", 100, float)
+    # same statement more often than this in one request is reported as a likely N+1
+    repeat_threshold = EnvValue("QUERY_REPEAT_THRESHOLD", 5, int)
+    # statements allowed per request for endpoints declaring no budget, 0 for no limit
+    default_budget = EnvValue("QUERY_BUDGET", 0, int)
+    # fail requests going over budget instead of logging them, for tests and CI
+    strict = EnvValue("QUERY_STRICT", False, as_bool)
+
+
+class HashSettings:
+    """Password hashing settings"""
+    rounds = EnvValue("BCRYPT_ROUNDS", 12, int)
+    workers = EnvValue("HASH_WORKERS", os.cpu_count() or 1, int)
+    max_pending = EnvValue("HASH_MAX_PENDING", 4 * (os.cpu_count() or 1), int)
+    retry_after = EnvValue("HASH_RETRY_AFTER", 1, int)
+
+
+class LogSettings:
+    """Logging pipeline settings"""
+    level = EnvValue("LOG_LEVEL", "INFO", str.upper)
+    # per logger levels, e.g. "app.repositories=WARNING,sqlalchemy.engine=INFO"
+    levels = EnvValue("LOG_LEVELS", "")
+    file = EnvValue("LOG_FILE", "")
+    max_bytes = EnvValue("LOG_MAX_BYTES", 10 * 1024 * 1024, int)
+    backups = EnvValue("LOG_BACKUPS", 5, int)
+    console = EnvValue("LOG_CONSOLE", True, as_bool)
+    # records waiting for the writer thread, more are dropped instead of blocking
+    queue_size = EnvValue("LOG_QUEUE_SIZE", 10000, int)
+    # records let through per call site and window, the rest are counted and dropped
+    rate_burst = EnvValue("LOG_RATE_BURST", 20, int)
+    rate_window = EnvValue("LOG_RATE_WINDOW", 10, float)
+
+
+class AdmissionSettings:
+    """Admission control settings, every limit applies per worker process"""
+    enabled = EnvValue("ADMISSION_ENABLED", True, as_bool)
+    # token buckets: requests a second and burst, per client ip and per user, 0 rate disables
+    ip_rate = EnvValue("ADMISSION_IP_RATE", 50, float)
+    ip_burst = EnvValue("ADMISSION_IP_BURST", 100, int)
+    user_rate = EnvValue("ADMISSION_USER_RATE", 20, float)
+    user_burst = EnvValue("ADMISSION_USER_BURST", 40, int)
+    # clients (ips and users) whose buckets are remembered, least recently seen dropped first
+    tracked_clients = EnvValue("ADMISSION_TRACKED_CLIENTS", 100000, int)
+    # requests served at once per route class, classes not listed are not capped
+    concurrency = EnvValue("ADMISSION_CONCURRENCY", "auth=4,read=64,write=16", as_int_map)
+    # requests of a capped class waiting for a slot, and how long they may wait
+    queue_size = EnvValue("ADMISSION_QUEUE", 32, int)
+    queue_timeout = EnvValue("ADMISSION_QUEUE_TIMEOUT", 0.5, float)
+    # Retry-After seconds of a 503 sent when the class stays saturated
+    retry_after = EnvValue("ADMISSION_RETRY_AFTER", 1, int)
+
+
+class ServerSettings:
+    """Production launcher settings (python -m app.launcher)"""
+    host = EnvValue("SERVER_HOST", "0.0.0.0")
+    port = EnvValue("SERVER_PORT", 4500, int)
+    workers = EnvValue("SERVER_WORKERS", os.cpu_count() or 1, int)
+    # seconds a stopping worker gets to finish its requests before it is killed
+    graceful_timeout = EnvValue("SERVER_GRACEFUL_TIMEOUT", 30, float)
+    # seconds a new worker gets to warm up during a rolling restart
+    startup_timeout = EnvValue("SERVER_STARTUP_TIMEOUT", 120, float)
 
 
 class ConfigSettings:
     """Config setting for security"""
-    secret = get_value("SECRET_KEY", default=str(uuid.uuid4()))
-    algorithm = get_value("ALGO", "HS256")
+    secret = EnvValue("SECRET_KEY", str(uuid.uuid4()))
+    algorithm = EnvValue("ALGO", "HS256")
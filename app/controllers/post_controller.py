@@ -1,44 +1,113 @@
-from fastapi import Depends, Request
+from typing import Optional
+
+import orjson
+from fastapi import Depends, Query, Request
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
-from sqlalchemy.orm import Session
 from starlette import status
+from starlette.responses import Response, StreamingResponse
 
-from app.models.generic_response import GenericResponseModel
-from app.models.post_model import AddPostModel
+from app.config.settings import PostSettings, SearchSettings
+from app.models.generic_response import GenericResponseModel, PagedResponseModel
+from app.models.post_model import AddPostModel, RemovePostsModel
 from app.services.post_service import PostService
-from app.utils.dependencies import get_db
-from app.utils.helper import build_response_model
+from app.utils.dependencies import get_db, DbSession, engine_registry, close_session
+from app.utils.helper import (
+    build_response_model, dump_json, etag_matches, iter_ndjson_lines, iterate_async, limit_body, read_body,
+)
+from app.utils.query_tracker import query_budget, untracked
 
 post_router = InferringRouter()
 
 
+async def list_posts(post_service: PostService, request: Request, after_id: int, limit: int,
+                     stream: bool = False, user_id: Optional[int] = None) -> Response:
+    """Paged (or NDJSON streamed) posts response, of every user or of one user"""
+    if stream:
+        return StreamingResponse(_stream_posts(after_id, user_id), media_type="application/x-ndjson")
+
+    # answer polling clients before touching the db
+    etag = post_service.get_posts_etag(after_id, limit, user_id)
+    cache_headers = {"ETag": etag, "Cache-Control": PostSettings.list_cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+    if user_id is None:
+        posts = await post_service.get_posts(after_id, limit)
+    else:
+        posts = await post_service.get_user_posts(user_id, after_id, limit)
+    if len(posts) > 0:
+        message = "results found"
+        data = posts
+    else:
+        message = "No data found"
+        data = []
+
+    next_cursor = posts[-1].id if len(posts) == limit else None
+    response_model = PagedResponseModel(
+        data=data, message=message, status_code=status.HTTP_200_OK, next_cursor=next_cursor
+    )
+    response = build_response_model(response_model)
+    response.headers.update(cache_headers)
+    return response
+
+
+async def _stream_posts(after_id: int, user_id: Optional[int] = None):
+    """NDJSON lines of posts, fetched in chunks on a session owned by the stream"""
+    session = engine_registry.session()
+    try:
+        # one keyset query per chunk by design, not counted against the request budget
+        with untracked():
+            async for chunk in PostService(session).iter_posts(after_id, user_id=user_id):
+                yield b"".join(dump_json(post) + b"\n" for post in chunk)
+    finally:
+        await close_session(session)
+
+
 @cbv(post_router)
 class PostController:
     """Class to handle all post related operations"""
 
-    def __init__(self, session: Session = Depends(get_db)):
+    def __init__(self, session: DbSession = Depends(get_db)):
         self.post_service = PostService(session)
 
     @post_router.get(
         "/list",
-        summary="Show all posts",
+        summary="Show all posts, or the posts of one user",
+        status_code=status.HTTP_200_OK,
+        response_model=PagedResponseModel,
+    )
+    @query_budget(2)
+    async def index(
+        self,
+        request: Request,
+        after_id: int = Query(default=0, ge=0),
+        limit: int = Query(default=PostSettings.list_default_limit, ge=1, le=PostSettings.list_max_limit),
+        stream: bool = False,
+        user: Optional[int] = Query(default=None, ge=1, description="Only posts of this user id"),
+    ):
+        """Show posts page by page, or stream all of them as NDJSON"""
+        return await list_posts(self.post_service, request, after_id, limit, stream, user)
+
+    @post_router.get(
+        "/search",
+        summary="Full text search over post titles and descriptions",
         status_code=status.HTTP_200_OK,
         response_model=GenericResponseModel,
     )
-    async def index(self):
-        """Show all posts"""
-        posts = self.post_service.get_posts()
-        if len(posts) > 0:
-            message = "results found"
-            data = posts
-        else:
-            message = "No data found"
-            data = []
+    # auth, posts by id, posts missing on a replica read again from the primary
+    @query_budget(3)
+    async def search(
+        self,
+        q: str = Query(min_length=1, max_length=200),
+        offset: int = Query(default=0, ge=0),
+        limit: int = Query(default=SearchSettings.default_limit, ge=1, le=SearchSettings.max_limit),
+    ):
+        """Ranked posts matching the query"""
+        result = await self.post_service.search_posts(q, offset, limit)
+        message = "results found" if result.total > 0 else "No data found"
 
-        response_model = GenericResponseModel(
-            data=data, message=message, status_code=status.HTTP_200_OK
-        )
+        response_model = GenericResponseModel(data=result, message=message, status_code=status.HTTP_200_OK)
         return build_response_model(response_model)
 
     @post_router.post(
@@ -47,10 +116,11 @@ class PostController:
         status_code=status.HTTP_201_CREATED,
         response_model=GenericResponseModel,
     )
+    @query_budget(2)
     async def add(self, request: Request, post_model: AddPostModel):
         """Add new post"""
         logged_in_user = request.state.user.user_id
-        post_id = self.post_service.add_new_post(post_model, logged_in_user)
+        post_id = await self.post_service.add_new_post(post_model, logged_in_user)
 
         if post_id > 0:
             status_code = status.HTTP_201_CREATED
@@ -66,14 +136,51 @@ class PostController:
         )
         return build_response_model(response_model)
 
+    @post_router.post(
+        "/bulk",
+        summary="Add many posts from a JSON array or an NDJSON stream",
+        status_code=status.HTTP_201_CREATED,
+        response_model=GenericResponseModel,
+    )
+    async def bulk(self, request: Request):
+        """Add many posts, reporting the items that failed"""
+        logged_in_user = request.state.user.user_id
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = iter_ndjson_lines(
+                limit_body(request.stream(), PostSettings.bulk_max_bytes), PostSettings.bulk_max_line_bytes
+            )
+        else:
+            try:
+                body = orjson.loads(await read_body(request.stream(), PostSettings.bulk_max_bytes))
+            except ValueError:
+                body = None
+            if not isinstance(body, list):
+                response_model = GenericResponseModel(
+                    message="Expected a JSON array of posts", status_code=status.HTTP_400_BAD_REQUEST
+                )
+                return build_response_model(response_model)
+            items = iterate_async(body)
+
+        result = await self.post_service.bulk_add_posts(items, logged_in_user)
+        if result.inserted > 0:
+            status_code = status.HTTP_201_CREATED
+            message = f"{result.inserted} posts created"
+        else:
+            status_code = status.HTTP_400_BAD_REQUEST
+            message = "No post could be created"
+
+        response_model = GenericResponseModel(data=result, message=message, status_code=status_code)
+        return build_response_model(response_model)
+
     @post_router.get(
         "/remove/{post_id}",
         status_code=status.HTTP_202_ACCEPTED,
         response_model=GenericResponseModel,
     )
+    @query_budget(3)
     async def remove(self, post_id):
         """Removing the seleted post"""
-        removed = self.post_service.remove_post(post_id)
+        removed = await self.post_service.remove_post(post_id)
         if removed:
             status_code = status.HTTP_202_ACCEPTED
             message = "The post has been removed"
@@ -83,3 +190,23 @@ class PostController:
 
         response_model = GenericResponseModel(message=message, status_code=status_code)
         return build_response_model(response_model)
+
+    @post_router.post(
+        "/remove",
+        summary="Remove many posts of the logged in user",
+        status_code=status.HTTP_202_ACCEPTED,
+        response_model=GenericResponseModel,
+    )
+    async def remove_many(self, request: Request, remove_model: RemovePostsModel):
+        """Removing the selected posts owned by the user"""
+        logged_in_user = request.state.user.user_id
+        removed = await self.post_service.remove_posts(remove_model.ids, logged_in_user)
+        if removed:
+            status_code = status.HTTP_202_ACCEPTED
+            message = f"{len(removed)} posts have been removed"
+        else:
+            status_code = status.HTTP_400_BAD_REQUEST
+            message = "Sorry, none of the posts could be removed"
+
+        response_model = GenericResponseModel(data=removed, message=message, status_code=status_code)
+        return build_response_model(response_model)
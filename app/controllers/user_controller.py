@@ -1,15 +1,17 @@
 from typing import Annotated
 
-from fastapi import Depends, status, Request
+from fastapi import Depends, Query, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
 
-from sqlalchemy.orm import Session
-
-from app.models.generic_response import GenericResponseModel
+from app.config.settings import PostSettings
+from app.controllers.post_controller import list_posts
+from app.models.generic_response import GenericResponseModel, PagedResponseModel
 from app.models.user_model import UserModel
+from app.services.post_service import PostService
 from app.services.user_service import UserService
-from app.utils.dependencies import get_db, get_oauth_scheme
+from app.utils.dependencies import get_db, get_oauth_scheme, DbSession
 from app.utils.helper import build_response_model
+from app.utils.query_tracker import query_budget
 
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
@@ -21,13 +23,15 @@ oauth_scheme = get_oauth_scheme()
 @cbv(user_router)
 class UserController:
 
-    def __init__(self, session: Session = Depends(get_db)):
+    def __init__(self, session: DbSession = Depends(get_db)):
+        self.session = session
         self.user_svc = UserService(session)
 
     @user_router.post('/register', summary="User registration", status_code=status.HTTP_201_CREATED,
                       response_model=GenericResponseModel)
+    @query_budget(3)
     async def register(self, user: Annotated[UserModel, Depends()]):
-        registered = self.user_svc.register(user)
+        registered = await self.user_svc.register(user)
 
         if registered:
             response_model = GenericResponseModel(status_code=status.HTTP_201_CREATED,
@@ -39,8 +43,10 @@ class UserController:
 
     @user_router.post('/token', summary="Oauth token login", status_code=status.HTTP_200_OK,
                       response_model=GenericResponseModel)
+    # login state, password rehashed on a cost change, session
+    @query_budget(3)
     async def login(self, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
-        token = self.user_svc.get_access_token(form_data)
+        token = await self.user_svc.get_access_token(form_data)
         if token.access_token is None:
             status_code = status.HTTP_401_UNAUTHORIZED
             response_model = GenericResponseModel(status_code=status_code, message="Token could not be generated")
@@ -51,12 +57,27 @@ class UserController:
 
     @user_router.get('/logout', summary="Logout from all sessions", status_code=status.HTTP_200_OK,
                      response_model=GenericResponseModel)
+    @query_budget(3)
     async def logout(self, request: Request):
         user = request.state.__getattr__('user')
-        success = self.user_svc.logout(user.token)
+        success = await self.user_svc.logout(user.token)
         if success:
             response_model = GenericResponseModel(status_code=status.HTTP_200_OK, message="Logout successful")
             return build_response_model(response_model)
 
         response_model = GenericResponseModel(status_code=status.HTTP_400_BAD_REQUEST, message="Could not logout")
         return build_response_model(response_model)
+
+    @user_router.get('/me/posts', summary="Posts of the logged in user", status_code=status.HTTP_200_OK,
+                     response_model=PagedResponseModel)
+    # auth, page, page read again when the cache fill loses a race
+    @query_budget(3)
+    async def my_posts(
+        self,
+        request: Request,
+        after_id: int = Query(default=0, ge=0),
+        limit: int = Query(default=PostSettings.list_default_limit, ge=1, le=PostSettings.list_max_limit),
+        stream: bool = False,
+    ):
+        user = request.state.user
+        return await list_posts(PostService(self.session), request, after_id, limit, stream, user.user_id)
@@ -0,0 +1,211 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Optional
+
+import uvicorn
+
+from app.config.settings import ConfigSettings, LogSettings, ServerSettings, get_value
+from app.utils.generations import SLOTS, generations, init_counters
+from app.utils.logger import get_logger, log_file_path, log_pipeline
+
+logger = get_logger(__name__)
+
+multiprocessing.allow_connection_pickling()
+_spawn = multiprocessing.get_context("spawn")
+
+# seconds before a worker that died during its warm-up is started again
+RESPAWN_BACKOFF = 5.0
+
+
+class _WorkerServer(uvicorn.Server):
+    """uvicorn server telling the launcher when its lifespan startup finished"""
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self._ready = ready
+
+    async def startup(self, sockets: Optional[list[socket.socket]] = None):
+        await super().startup(sockets)
+        if self.started:
+            self._ready.set()
+
+
+def _run_worker(config: uvicorn.Config, sockets: list[socket.socket], log_index: int, counters, lock, ready):
+    """Worker process entry point, serves the app on the launcher's socket"""
+    # one file per worker, rotating a shared file from several processes loses records
+    path = log_file_path()
+    LogSettings.file = str(path.with_name(f"{path.stem}.{log_index}{path.suffix}"))
+    generations.attach(counters, lock)
+    config.configure_logging()
+    try:
+        _WorkerServer(config, ready).run(sockets=sockets)
+    except KeyboardInterrupt:
+        pass
+
+
+class _Worker:
+    def __init__(self, slot: int, log_index: int, process, ready):
+        self.slot = slot
+        self.log_index = log_index
+        self.process = process
+        self.ready = ready
+
+
+class Launcher:
+    """Runs the app on N worker processes sharing one listening socket
+
+    Workers share the invalidation generations (app.utils.generations) through
+    shared memory, so a write in one worker drops the stale cache entries of
+    every other one. Dead workers are started again. SIGHUP restarts the
+    workers one at a time, each old worker being stopped only once its
+    replacement finished warming up; SIGTERM and SIGINT stop every worker,
+    giving them graceful_timeout seconds to finish their requests.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, graceful_timeout: float, startup_timeout: float):
+        self.config = config
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.startup_timeout = startup_timeout
+        self._counters = _spawn.RawArray("Q", SLOTS)
+        init_counters(self._counters)
+        self._lock = _spawn.Lock()
+        self._socket: Optional[socket.socket] = None
+        self._workers: list[_Worker] = []
+        self._signals: list[int] = []
+        self._wake = threading.Event()
+        self.restarts = 0
+
+    def _spawn_worker(self, slot: int, log_index: Optional[int] = None) -> _Worker:
+        """Starts the worker of the slot, logging to the file of log_index (the slot's own by default)"""
+        log_index = slot if log_index is None else log_index
+        ready = _spawn.Event()
+        # not a daemon, workers run their own password hashing processes
+        process = _spawn.Process(
+            target=_run_worker,
+            args=(self.config, [self._socket], log_index, self._counters, self._lock, ready),
+            name=f"worker-{slot}",
+        )
+        process.start()
+        logger.info(f"Started worker {slot} [{process.pid}] logging to file {log_index}")
+        return _Worker(slot, log_index, process, ready)
+
+    def _other_log_index(self, worker: _Worker) -> int:
+        """Log file of a replacement running next to the worker: each slot alternates between two files"""
+        return worker.log_index + self.workers if worker.log_index < self.workers else worker.slot
+
+    def _stop_workers(self, workers: list[_Worker]):
+        """Asks the workers to shut down gracefully, kills those still running after the timeout"""
+        for worker in workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + self.graceful_timeout
+        for worker in workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logger.warning(f"Worker {worker.slot} [{worker.process.pid}] did not stop in time, killing it")
+                worker.process.kill()
+                worker.process.join()
+
+    def _wait_ready(self, worker: _Worker) -> bool:
+        """Waits for the worker's warm-up, False when it died or timed out"""
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if worker.ready.wait(0.2):
+                return True
+            if not worker.process.is_alive():
+                return False
+        return False
+
+    def _rolling_restart(self):
+        """Replaces every worker, one at a time, without ever dropping below N ready workers"""
+        logger.info("Rolling restart of the workers")
+        for index, old in enumerate(list(self._workers)):
+            # both run until the new one is ready, each needs its own log file
+            new = self._spawn_worker(old.slot, self._other_log_index(old))
+            if not self._wait_ready(new):
+                logger.error(f"Replacement of worker {old.slot} failed to start, restart aborted")
+                self._stop_workers([new])
+                return
+            self._workers[index] = new
+            self._stop_workers([old])
+        self.restarts += 1
+        logger.info("Rolling restart done")
+
+    def _reap(self):
+        """Starts a new worker in place of every one that exited"""
+        for index, worker in enumerate(self._workers):
+            if worker.process.is_alive():
+                continue
+            logger.warning(f"Worker {worker.slot} [{worker.process.pid}] exited with code {worker.process.exitcode}")
+            if not worker.ready.is_set():
+                # failed during warm-up, likely to fail again right away
+                self._wake.wait(RESPAWN_BACKOFF)
+                if self._signals:
+                    return
+            # the dead worker's log file is free again
+            self._workers[index] = self._spawn_worker(worker.slot, worker.log_index)
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+        self._wake.set()
+
+    def run(self):
+        """Serves until SIGTERM or SIGINT"""
+        self._socket = self.config.bind_socket()
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self._on_signal)
+
+        logger.info(f"Launching {self.workers} workers on {self.config.host}:{self.config.port} [{os.getpid()}]")
+        self._workers = [self._spawn_worker(slot) for slot in range(self.workers)]
+        try:
+            while True:
+                self._wake.wait(0.5)
+                self._wake.clear()
+                while self._signals:
+                    signum = self._signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self._rolling_restart()
+                    else:
+                        logger.info(f"Received {signal.Signals(signum).name}, stopping the workers")
+                        return
+                self._reap()
+        finally:
+            self._stop_workers(self._workers)
+            self._socket.close()
+            logger.info("Launcher exiting..")
+
+
+def main():
+    """Production server: python -m app.launcher"""
+    log_pipeline.start()
+    # every worker must sign and verify tokens with the same key
+    os.environ.setdefault("SECRET_KEY", ConfigSettings.secret)
+    # every worker runs its own hashing pool, unless set they share the cpus instead of each taking them all
+    if not get_value("HASH_WORKERS", ""):
+        os.environ["HASH_WORKERS"] = str(max(1, (os.cpu_count() or 1) // ServerSettings.workers))
+    config = uvicorn.Config(
+        "app.main:app",
+        host=ServerSettings.host,
+        port=ServerSettings.port,
+        workers=ServerSettings.workers,
+        lifespan="on",
+        # no uvicorn handlers, its error and access logs propagate to the queued pipeline
+        log_config=None,
+        timeout_graceful_shutdown=int(ServerSettings.graceful_timeout),
+    )
+    Launcher(
+        config,
+        workers=ServerSettings.workers,
+        graceful_timeout=ServerSettings.graceful_timeout,
+        startup_timeout=ServerSettings.startup_timeout,
+    ).run()
+    log_pipeline.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,160 @@
-from contextlib import asynccontextmanager
+import time
+from contextlib import asynccontextmanager, contextmanager
 
 import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy.orm import configure_mappers
 from starlette import status
-from starlette.responses import HTMLResponse, JSONResponse
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response
 
+from app.config.settings import AdmissionSettings, DbSettings, MetricsSettings, QuerySettings, TokenSweepSettings
 from app.controllers import user_controller, post_controller
-from app.services.user_service import UserService
-from app.utils.dependencies import get_db
-from app.utils.logger import logger
+from app.middlewares.admission import AdmissionControlMiddleware, UserRateLimitMiddleware
+from app.middlewares.authentication import AuthenticationMiddleware
+from app.middlewares.metrics import MetricsMiddleware
+from app.middlewares.query_tracking import QueryTrackingMiddleware
+from app.schema.bootstrap import bootstrap_schema
+from app.services.post_service import PostService
+from app.services.token_sweeper import token_sweeper
+from app.utils.admission import admission_control
+from app.utils.dependencies import engine_registry, close_session
+from app.utils.hashing import password_hasher
+from app.utils.helper import FastJSONResponse
+from app.utils.logger import get_logger, log_pipeline
+from app.utils.metrics import configure_metrics, instrument_engine, registry
+from app.utils.query_tracker import track_queries
+
+logger = get_logger(__name__)
+
+
+@contextmanager
+def _timed(timings: dict, step: str):
+    """Records the duration of a startup step in seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[step] = time.perf_counter() - started
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Init app
-    logger.info("App started..")
+    # Init app, every subsystem is warmed here before the first request
+    app.state.ready = False
+    app.state.startup_timings = timings = {}
+    with _timed(timings, "logging"):
+        log_pipeline.start()
+    if MetricsSettings.enabled:
+        configure_metrics()
+    with _timed(timings, "db_engine"):
+        engine_registry.start()
+        for engine in engine_registry.engines:
+            if MetricsSettings.enabled:
+                instrument_engine(engine)
+            if QuerySettings.enabled:
+                track_queries(engine)
+        configure_mappers()
+    with _timed(timings, "db_pool"):
+        await engine_registry.warm_up(DbSettings.pool_warm)
+    if DbSettings.bootstrap:
+        with _timed(timings, "schema_bootstrap"):
+            created = await engine_registry.run_sync(bootstrap_schema)
+        logger.info(f"Schema bootstrap created: {created}")
+    with _timed(timings, "password_hashing"):
+        await password_hasher.warm_up()
+    with _timed(timings, "search_index"):
+        await _build_search_index()
+    with _timed(timings, "post_list_cache"):
+        await _warm_post_list_cache()
+    if TokenSweepSettings.enabled:
+        token_sweeper.start()
+    app.state.ready = True
+    logger.info(
+        f"App started.. warm-up {sum(timings.values()):.2f}s ("
+        + ", ".join(f"{step} {seconds:.3f}s" for step, seconds in timings.items()) + ")"
+    )
     yield
     # End the app
+    app.state.ready = False
+    await token_sweeper.stop()
+    password_hasher.shutdown()
+    await engine_registry.dispose()
     logger.info("App exiting..")
-
-
-app = FastAPI(lifespan=lifespan)
+    log_pipeline.stop()
+
+
+async def _build_search_index():
+    session = engine_registry.session()
+    try:
+        started = time.perf_counter()
+        indexed = await PostService(session).build_search_index()
+        logger.info(f"Search index built for {indexed} posts in {time.perf_counter() - started:.2f}s")
+    finally:
+        await close_session(session)
+
+
+async def _warm_post_list_cache():
+    """Loads the first posts page, the one every client starts from"""
+    session = engine_registry.session()
+    try:
+        await PostService(session).get_posts()
+    finally:
+        await close_session(session)
+
+
+# exact (method, path) pairs reachable without a token
+PUBLIC_ROUTES = [
+    ("GET", "/"),
+    ("GET", "/docs"),
+    ("GET", "/docs/oauth2-redirect"),
+    ("GET", "/redoc"),
+    ("GET", "/openapi.json"),
+    ("GET", "/favicon.ico"),
+    ("GET", "/health/live"),
+    ("GET", "/health/ready"),
+    ("POST", "/api/v1/users/register"),
+    ("POST", "/api/v1/users/token"),
+]
+if MetricsSettings.enabled:
+    # scraped without a token
+    PUBLIC_ROUTES.append(("GET", MetricsSettings.path))
+
+# admission control classes by method and path prefix, first match wins, others are "default"
+ROUTE_CLASSES = [
+    ("POST", "/api/v1/users/token", "auth"),
+    ("POST", "/api/v1/users/register", "auth"),
+    ("GET", "/api/v1/users/logout", "write"),
+    ("GET", "/api/v1/posts/remove/", "write"),
+    ("POST", "/api/v1/posts/", "write"),
+    ("GET", "/api/v1/posts/", "read"),
+    ("GET", "/api/v1/users/me/posts", "read"),
+]
+# never limited, probes and scrapes must get through a saturated worker
+ADMISSION_EXEMPT_PATHS = ["/health/live", "/health/ready", MetricsSettings.path]
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+if AdmissionSettings.enabled:
+    # inside authentication, so it knows the user
+    app.add_middleware(UserRateLimitMiddleware, control=admission_control)
+# added before CORS so CORS wraps it and answers preflight requests itself
+app.add_middleware(AuthenticationMiddleware, public_routes=PUBLIC_ROUTES)
+if AdmissionSettings.enabled:
+    # outside authentication, so requests with bad tokens are limited before any token lookup
+    app.add_middleware(AdmissionControlMiddleware, control=admission_control, route_classes=ROUTE_CLASSES,
+                       exempt_paths=ADMISSION_EXEMPT_PATHS, retry_after=AdmissionSettings.retry_after)
 app.add_middleware(CORSMiddleware,
                    allow_credentials=True,
                    allow_origins="*",
                    allow_methods="*",
                    allow_headers="*")
+if QuerySettings.enabled:
+    app.add_middleware(QueryTrackingMiddleware, strict=QuerySettings.strict)
+if MetricsSettings.enabled:
+    # outermost, so the latency includes CORS and authentication
+    app.add_middleware(MetricsMiddleware)
 app.include_router(user_controller.user_router, prefix="/api/v1/users", tags=["Users"])
 app.include_router(post_controller.post_router, prefix="/api/v1/posts", tags=["Posts"])
 
@@ -47,44 +175,31 @@ def index():
 """
 
 
-@app.middleware("http")
-async def authenticate(request: Request, call_next):
-    """Authenticate requests middleware"""
-    auth_header = request.headers.get("Authorization")
-    permitted = _is_permitted(request.method, request.url.path, auth_header, request)
-
-    if not permitted:
-        return JSONResponse(content="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED,
-                            headers={"WWW-Authenticate": "Bearer"})
-
-    return await call_next(request)
-
-
-def _is_permitted(method: str, api, header: str, request: Request):
-    """Is the user permitted to enter"""
-    api_call = api[1:]
-    if method == 'GET' and api_call in ['docs', 'openapi.json', 'favicon.ico']:
-        return True
-
-    excluded_apis = ['/register', '/token', '/']
+@app.get("/health/live", include_in_schema=False)
+def live():
+    """The process is up and serving"""
+    return {"status": "ok"}
 
-    for ex_api in excluded_apis:
-        if api_call.endswith(ex_api):
-            return True
 
-    scheme, data = (header or ' ').split(' ', 1)
+@app.get("/health/ready", include_in_schema=False)
+def ready(request: Request):
+    """Warm-up finished and not shutting down, with the startup step durations"""
+    is_ready = getattr(request.app.state, "ready", False)
+    content = {
+        "status": "ready" if is_ready else "unavailable",
+        "startup_timings": getattr(request.app.state, "startup_timings", {}),
+    }
+    status_code = status.HTTP_200_OK if is_ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return FastJSONResponse(content, status_code=status_code)
 
-    if scheme != 'Bearer':
-        return False
 
-    user_info = UserService(session=get_db()).authenticate(data)
+async def metrics():
+    return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
 
-    # set request object to use
-    if user_info is not None:
-        request.state.__setattr__('user', user_info)
 
-    return user_info is not None
+if MetricsSettings.enabled:
+    app.add_api_route(MetricsSettings.path, metrics, methods=["GET"], include_in_schema=False)
 
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=4500, reload=True)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=4500, reload=True, log_config=None)
@@ -0,0 +1,106 @@
+import math
+from typing import Iterable
+
+from starlette import status
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.utils.admission import AdmissionControl
+from app.utils.helper import FastJSONResponse
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# route class of requests matching no rule, rate limited but not capped unless configured
+DEFAULT_CLASS = "default"
+# request state key the route class is passed on with
+ROUTE_CLASS_KEY = "route_class"
+
+
+async def reject(control: AdmissionControl, scope: Scope, receive: Receive, send: Send, reason: str,
+                 route_class: str, status_code: int, detail: str, retry_after: int):
+    """Counts the rejection and answers with Retry-After"""
+    control.reject(reason, route_class)
+    logger.warning(f"Rejected {scope['method']} {scope['path']} ({route_class}): {reason}")
+    response = FastJSONResponse(
+        {"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, retry_after))}
+    )
+    await response(scope, receive, send)
+
+
+class AdmissionControlMiddleware:
+    """Pure ASGI middleware admitting requests before authentication
+
+    Every request takes a token of its client ip's bucket, an empty bucket is
+    answered with a 429, so a flood of bad tokens is limited before any token
+    lookup. Requests are then classified by the first (method, path prefix,
+    class) rule matching, and a class with a concurrency cap makes requests
+    wait briefly for a slot, answering 503 when the wait queue is full or the
+    wait times out. Both carry ``Retry-After``. Exempt paths (health checks,
+    metrics) are never limited. The per-user limit is applied after
+    authentication by UserRateLimitMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp, control: AdmissionControl, route_classes: Iterable[tuple[str, str, str]],
+                 exempt_paths: Iterable[str] = (), retry_after: int = 1):
+        self.app = app
+        self.control = control
+        self.route_classes = list(route_classes)
+        self.exempt_paths = frozenset(exempt_paths)
+        self.retry_after = retry_after
+
+    def route_class(self, method: str, path: str) -> str:
+        for rule_method, prefix, route_class in self.route_classes:
+            if method == rule_method and path.startswith(prefix):
+                return route_class
+        return DEFAULT_CLASS
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.route_class(scope["method"], scope["path"])
+        scope.setdefault("state", {})[ROUTE_CLASS_KEY] = route_class
+        client = scope.get("client")
+        wait = self.control.check_ip(client[0]) if client else 0.0
+        if wait:
+            await reject(self.control, scope, receive, send, "ip_rate", route_class,
+                         status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", math.ceil(wait))
+            return
+
+        limiter = self.control.limiter(route_class)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await limiter.acquire()
+        if reason is not None:
+            await reject(self.control, scope, receive, send, reason, route_class,
+                         status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy", self.retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+class UserRateLimitMiddleware:
+    """Pure ASGI middleware taking a token of the authenticated user's bucket, 429 when empty
+
+    Runs right after authentication, which puts the user in the request state.
+    """
+
+    def __init__(self, app: ASGIApp, control: AdmissionControl):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        state = scope.get("state", {})
+        user = state.get("user")
+        if scope["type"] == "http" and user is not None:
+            wait = self.control.check_user(user.user_id)
+            if wait:
+                await reject(self.control, scope, receive, send, "user_rate", state.get(ROUTE_CLASS_KEY, DEFAULT_CLASS),
+                             status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", math.ceil(wait))
+                return
+        await self.app(scope, receive, send)
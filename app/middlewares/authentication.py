@@ -0,0 +1,64 @@
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.models.user_model import UserInRequestModel
+from app.services.user_service import UserService
+from app.utils.dependencies import engine_registry, close_session
+from app.utils.helper import FastJSONResponse
+from app.utils.token_cache import token_cache
+
+
+class AuthenticationMiddleware:
+    """Pure ASGI middleware authenticating bearer tokens
+
+    Requests whose (method, path) is in the public route table pass through,
+    every other http request needs a valid token. The verified user is put in
+    the request state as ``request.state.user``.
+    """
+
+    def __init__(self, app: ASGIApp, public_routes: Iterable[tuple[str, str]]):
+        self.app = app
+        self.public_routes = frozenset(public_routes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) in self.public_routes:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            user_info = await self._authenticate(Headers(scope=scope).get("authorization"))
+        except HTTPException as ex:
+            response = FastJSONResponse({"detail": ex.detail}, status_code=ex.status_code, headers=ex.headers)
+            await response(scope, receive, send)
+            return
+
+        if user_info is None:
+            response = FastJSONResponse(
+                "Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED, headers={"WWW-Authenticate": "Bearer"}
+            )
+            await response(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["user"] = user_info
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _authenticate(header: Optional[str]) -> Optional[UserInRequestModel]:
+        """Verified user of the bearer token, from the token cache or the db"""
+        scheme, _, token = (header or "").partition(" ")
+        if scheme != "Bearer" or not token:
+            return None
+
+        user_info = token_cache.get(token)
+        if user_info is None:
+            session = engine_registry.session()
+            try:
+                user_info = await UserService(session=session).authenticate(token)
+            finally:
+                await close_session(session)
+
+        return user_info
@@ -0,0 +1,75 @@
+import time
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.metrics import request_duration, requests_in_progress
+
+UNMATCHED_ROUTE = "<unmatched>"
+KNOWN_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency per route and in-flight requests
+
+    Requests are labelled with the route template (``/remove/{post_id}``), not
+    the raw path, so label values stay bounded. The template is looked up from
+    the endpoint the router resolved, routes are only matched again for
+    requests that never reached the router (rejected by authentication).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_paths: dict = {}
+        # labelled metric children, labels() takes a lock on every call
+        self._in_progress: dict = {}
+        self._durations: dict = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # methods are client supplied, keep the label values bounded
+        method = scope["method"] if scope["method"] in KNOWN_METHODS else "OTHER"
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = self._in_progress.get(method)
+        if in_progress is None:
+            in_progress = self._in_progress[method] = requests_in_progress.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            key = (method, self._route_template(scope), status_code)
+            duration = self._durations.get(key)
+            if duration is None:
+                duration = self._durations[key] = request_duration.labels(key[0], key[1], str(status_code))
+            duration.observe(elapsed)
+
+    def _route_template(self, scope: Scope) -> str:
+        """Path template of the route serving the request"""
+        endpoint = scope.get("endpoint")
+        if endpoint is not None:
+            path = self._route_paths.get(endpoint)
+            if path is None:
+                self._route_paths.update(
+                    (route.endpoint, route.path) for route in scope["app"].routes if hasattr(route, "endpoint")
+                )
+                path = self._route_paths.get(endpoint, UNMATCHED_ROUTE)
+            return path
+
+        for route in scope["app"].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return UNMATCHED_ROUTE
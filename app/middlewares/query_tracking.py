@@ -0,0 +1,66 @@
+import re
+import uuid
+
+from starlette import status
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.helper import FastJSONResponse
+from app.utils.logger import get_logger
+from app.utils.query_tracker import track_request
+
+logger = get_logger(__name__)
+
+# client supplied ids end up in logs and headers, accept only short plain tokens
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+class QueryTrackingMiddleware:
+    """Pure ASGI middleware counting and timing the SQL statements of each request
+
+    Every request gets a request id (taken from ``X-Request-ID`` when the client
+    sends one) that is echoed back along with ``X-Query-Count``. In strict mode
+    a request going over its query budget is answered with a 500 instead of
+    its response, so tests fail on the regression.
+    """
+
+    def __init__(self, app: ASGIApp, strict: bool = False):
+        self.app = app
+        self.strict = strict
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id", "")
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        with track_request(request_id, scope) as queries:
+            replaced = False
+
+            async def send_wrapper(message: Message):
+                nonlocal replaced
+                if replaced:
+                    return
+                if message["type"] == "http.response.start":
+                    if self.strict and queries.over_budget:
+                        replaced = True
+                        response = FastJSONResponse(
+                            {"detail": f"Query budget of {queries.budget} exceeded: {queries.count} statements"},
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            headers={"X-Request-ID": request_id},
+                        )
+                        await response(scope, receive, send)
+                        return
+                    headers = MutableHeaders(scope=message)
+                    headers["X-Request-ID"] = request_id
+                    headers["X-Query-Count"] = str(queries.count)
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+            if self.strict and queries.over_budget and not replaced:
+                # statements issued after the response started, e.g. while streaming
+                logger.error(f"Query budget of {queries.budget} exceeded after the response started "
+                             f"on {queries.route} [{request_id}]")
@@ -10,3 +10,9 @@ class GenericResponseModel(BaseModel):
     message: Optional[str] = None
     data: Any
     status_code: Optional[int] = None
+
+
+class PagedResponseModel(GenericResponseModel):
+    """Generic model with the cursor of the next page"""
+
+    next_cursor: Optional[int] = None
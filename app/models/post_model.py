@@ -2,14 +2,40 @@ from typing import Optional, Any
 
 from pydantic import BaseModel, Field
 
+from app.config.settings import PostSettings
+
 
 class AddPostModel(BaseModel):
     title: str = Field(min_length=5, max_length=50)
     description: str = Field(default=None, max_length=150)
 
 
+class RemovePostsModel(BaseModel):
+    ids: list[int] = Field(min_items=1, max_items=PostSettings.delete_max_ids)
+
+
 class ShowPostsModel(BaseModel):
     id: int
     title: Optional[str]
     description: Optional[str]
     user: Optional[Any]
+
+    @classmethod
+    def from_row(cls, row) -> "ShowPostsModel":
+        """Fast constructor for trusted (id, title, description, email) db rows, skips validation"""
+        return cls.construct(id=row.id, title=row.title, description=row.description, user=row.email)
+
+
+class BulkPostErrorModel(BaseModel):
+    index: int
+    error: str
+
+
+class BulkPostResultModel(BaseModel):
+    inserted: int = 0
+    failed: list[BulkPostErrorModel] = []
+
+
+class SearchPostsResultModel(BaseModel):
+    total: int = 0
+    posts: list[ShowPostsModel] = []
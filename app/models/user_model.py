@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr
 import datetime
+from typing import Optional
 
 
 class UserModel(BaseModel):
@@ -14,6 +15,14 @@ class ActiveSessionModel(BaseModel):
     expiry_time: datetime.datetime
 
 
+class LoginStateModel(BaseModel):
+    user_id: int
+    username: str
+    password: str
+    access_token: Optional[str] = None
+    expiry_time: Optional[datetime.datetime] = None
+
+
 class UserInRequestModel(BaseModel):
     user_id: int
     username: str
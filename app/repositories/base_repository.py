@@ -1,6 +1,68 @@
-from sqlalchemy.orm import Session
+from typing import Any, Callable
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.dependencies import DbSession
+from app.utils.generations import generations
+from app.utils.logger import get_logger
+from app.utils.routing import PRIMARY, READ_ONLY, REPLICA, replica_pool
+
+logger = get_logger(__name__)
 
 
 class BaseRepository:
-    def __init__(self, session: Session):
-        self._session = session
+    def __init__(self, session: DbSession):
+        if isinstance(session, AsyncSession):
+            self._async_session = session
+            self._session = session.sync_session
+        else:
+            self._async_session = None
+            self._session = session
+
+    async def run(self, method: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs a repository method without blocking the event loop
+
+        With an AsyncSession the method runs on the async driver through
+        ``run_sync``, otherwise it is moved to the thread pool. Methods marked
+        ``@read_only`` may be served by a replica.
+        """
+        if getattr(method, "__read_only__", False):
+            method, args, kwargs = self._read, (method, args, kwargs), {}
+        if self._async_session is not None:
+            return await self._async_session.run_sync(lambda _: method(*args, **kwargs))
+        return await run_in_threadpool(method, *args, **kwargs)
+
+    def _read(self, method: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        """Calls a read only method, once more when the replica serving it failed"""
+        info = self._session.info
+        info[READ_ONLY] = True
+        try:
+            return method(*args, **kwargs)
+        except OperationalError as ex:
+            if info.get(PRIMARY) or info.pop(REPLICA, None) is None:
+                raise
+            # the replica is ejected by now, read from the next one or the primary
+            logger.warning(f"Read on a replica failed, retrying: {ex}")
+            self._session.rollback()
+            return method(*args, **kwargs)
+        finally:
+            info[READ_ONLY] = False
+
+    def use_primary(self) -> bool:
+        """Sends the session's later reads to the primary, True when they went to a replica so far"""
+        was_on_replica = not self._session.info.get(PRIMARY) and self._session.info.get(REPLICA) is not None
+        self._session.info[PRIMARY] = True
+        return was_on_replica
+
+    def use_primary_after_write(self, *channels: int) -> bool:
+        """Sends the session's reads to the primary while the replicas may still miss a write of the channels
+
+        True when it did; once every channel went max_lag seconds without a
+        write, reads that must be current (cache fills) can be served by replicas.
+        """
+        if any(generations.seconds_since_write(channel) < replica_pool.max_lag for channel in channels):
+            self.use_primary()
+            return True
+        return False
@@ -1,35 +1,57 @@
-from cachetools import cached, TTLCache
-from sqlalchemy.orm import Session
+from typing import Optional
 
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import DBAPIError
+
+from app.config.settings import PostSettings
 from app.models.post_model import AddPostModel, ShowPostsModel
 from app.repositories.base_repository import BaseRepository
 from app.schema.post import PostTable
-from app.utils.logger import logger
+from app.schema.user import UserTable
+from app.utils.dependencies import DbSession
+from app.utils.generations import POSTS, generations
+from app.utils.logger import get_logger
+from app.utils.post_cache import post_list_cache, user_feed_cache
+from app.utils.routing import read_only
+from app.utils.search_index import post_search_index
+
+logger = get_logger(__name__)
 
 
 class PostRepository(BaseRepository):
     """Class to work for posts"""
 
-    def __init__(self, session: Session):
+    def __init__(self, session: DbSession):
         super().__init__(session)
 
-    @cached(cache=TTLCache(maxsize=1024, ttl=300))
-    def get_list(self) -> list[ShowPostsModel]:
-        """Get list of posts for all users"""
-        posts = self._session.query(PostTable).all()
-        model_list = []
-
-        for post in posts:
-            model_list.append(
-                ShowPostsModel(
-                    id=post.id,
-                    title=post.title,
-                    description=post.description,
-                    user=post.user.email,
-                )
-            )
+    @read_only
+    def get_list(self, after_id: int = 0, limit: int = PostSettings.list_default_limit,
+                 user_id: Optional[int] = None) -> list[ShowPostsModel]:
+        """Get a page of posts for all users, or one user, ordered by id after the given cursor"""
+        # single joined projection, no lazy load of post.user per row
+        statement = self._select_posts().where(PostTable.id > after_id)
+        if user_id is not None:
+            # served by the posts.user_id index, which also orders by id
+            statement = statement.where(PostTable.user_id == user_id)
+        rows = self._session.execute(statement.order_by(PostTable.id).limit(limit)).all()
 
-        return model_list
+        return [ShowPostsModel.from_row(row) for row in rows]
+
+    @read_only
+    def get_by_ids(self, post_ids: list[int]) -> list[ShowPostsModel]:
+        """Posts for the ids, in the order of the ids"""
+        if not post_ids:
+            return []
+        rows = self._session.execute(self._select_posts().where(PostTable.id.in_(post_ids))).all()
+        posts = {row.id: ShowPostsModel.from_row(row) for row in rows}
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+    @staticmethod
+    def _select_posts():
+        """Joined projection of posts with the author email"""
+        return select(PostTable.id, PostTable.title, PostTable.description, UserTable.email).outerjoin(
+            UserTable, PostTable.user_id == UserTable.id
+        )
 
     def add_post(self, post_model: AddPostModel, user_id: int) -> int:
         """Adds new post"""
@@ -42,18 +64,128 @@ class PostRepository(BaseRepository):
             post_id = post_table_model.id
 
             self._session.commit()
+            self._posts_added(user_id, [ShowPostsModel.construct(id=post_id, user=None, **post_model.dict())])
         except Exception as ex:
             logger.error(ex)
 
         return post_id
 
+    def add_posts(self, rows: list[tuple[int, AddPostModel]], user_id: int) -> list[tuple[int, str]]:
+        """Adds a chunk of (index, post) rows with one executemany in one transaction
+        :returns (index, error) of the rows that could not be inserted
+        """
+        values = [dict(post_model.dict(), user_id=user_id) for _, post_model in rows]
+        try:
+            added = self._insert_posts(values, user_id)
+            self._session.commit()
+            self._posts_added(user_id, added)
+            return []
+        except DBAPIError as ex:
+            logger.error(ex)
+            self._session.rollback()
+
+        # isolate the failing rows, keeping the others in one transaction
+        failures, added = [], []
+        for (index, post_model), row_values in zip(rows, values):
+            try:
+                with self._session.begin_nested():
+                    result = self._session.execute(insert(PostTable).values(**row_values))
+                added.append(self._added_post(result.inserted_primary_key[0], post_model))
+            except DBAPIError as ex:
+                # the database error stays in the log, it is no business of the client
+                logger.error(f"Bulk post {index} of user {user_id} not inserted: {ex.orig}")
+                failures.append((index, "Post could not be stored"))
+        self._session.commit()
+        self._posts_added(user_id, added)
+
+        return failures
+
+    def _insert_posts(self, values: list[dict], user_id: int) -> list[ShowPostsModel]:
+        """Inserts the rows with one executemany, returns the added posts"""
+        if self._session.get_bind().dialect.insert_executemany_returning:
+            # the returned rows carry what the caches need, in whatever order they come back: asking
+            # for the parameter order would make SQLAlchemy insert row by row on some dialects
+            rows = self._session.execute(
+                insert(PostTable).returning(PostTable.id, PostTable.title, PostTable.description), values
+            ).all()
+            return [
+                ShowPostsModel.construct(id=row.id, title=row.title, description=row.description, user=None)
+                for row in rows
+            ]
+
+        # no RETURNING with executemany (MySQL), and the auto-increment ids of one multi-row
+        # insert are not guaranteed to be consecutive: new rows are read back above the max id
+        floor_id = self._session.scalar(select(func.max(PostTable.id))) or 0
+        self._session.execute(insert(PostTable), values)
+        return self._get_user_posts_after(user_id, floor_id)
+
+    @staticmethod
+    def _added_post(post_id: int, post_model: AddPostModel) -> ShowPostsModel:
+        """Post as listed, the author email is filled in by the caches"""
+        return ShowPostsModel.construct(id=post_id, user=None, **post_model.dict())
+
+    def _get_user_posts_after(self, user_id: int, after_id: int) -> list[ShowPostsModel]:
+        rows = self._session.execute(
+            self._select_posts()
+            .where(PostTable.id > after_id, PostTable.user_id == user_id)
+            .order_by(PostTable.id)
+        ).all()
+        return [ShowPostsModel.from_row(row) for row in rows]
+
     def delete_post(self, post_id: int) -> bool:
         """Deletion of existing post"""
         delete_success = False
         post = self._session.get(PostTable, post_id)
         if post is not None:
+            removed_id, owner_id = post.id, post.user_id
             self._session.delete(post)
             self._session.commit()
+            self._posts_removed(owner_id, [removed_id])
             delete_success = True
 
         return delete_success
+
+    def delete_posts(self, post_ids: list[int], user_id: int,
+                     chunk_size: int = PostSettings.delete_chunk_size) -> list[int]:
+        """Set based deletion of the user's own posts, one transaction per chunk
+        :returns ids that were actually removed
+        """
+        removed = []
+        unique_ids = sorted(set(post_ids))
+        for start in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[start:start + chunk_size]
+            owned = self._session.execute(
+                select(PostTable.id)
+                .where(PostTable.id.in_(chunk), PostTable.user_id == user_id)
+                .with_for_update()
+            ).scalars().all()
+            if owned:
+                self._session.execute(
+                    delete(PostTable).where(PostTable.id.in_(owned)),
+                    execution_options={"synchronize_session": False},
+                )
+            self._session.commit()
+            removed.extend(owned)
+
+        if removed:
+            self._posts_removed(user_id, removed)
+        return removed
+
+    @staticmethod
+    def _posts_added(user_id: int, posts: list):
+        """Propagates committed inserts of the user to the post caches and search index of every worker"""
+        generation = generations.bump(POSTS)
+        post_list_cache.invalidate()
+        user_feed_cache.posts_added(user_id, posts, generation)
+        post_search_index.add_many(posts)
+        post_search_index.posts_written(generation)
+
+    @staticmethod
+    def _posts_removed(user_id: int, post_ids: list[int]):
+        """Propagates committed deletes of the user's posts to the post caches and search index of every worker"""
+        generation = generations.bump(POSTS)
+        post_list_cache.invalidate()
+        user_feed_cache.posts_removed(user_id, post_ids, generation)
+        for post_id in post_ids:
+            post_search_index.remove(post_id)
+        post_search_index.posts_written(generation)
@@ -4,31 +4,35 @@ from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from jose import jwt, JWTError
-from passlib.hash import bcrypt
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.config.settings import ConfigSettings
 from app.models.user_model import (
     UserModel,
     ActiveSessionModel,
+    LoginStateModel,
     UserInRequestModel,
     UserGenericModel,
 )
 from app.repositories.base_repository import BaseRepository
 from app.schema.user import UserTable
 from app.schema.user_token import UserTokenTable
-from app.utils.dependencies import get_pwd_context, get_connection
+from app.utils.dependencies import DbSession
+from app.utils.generations import SESSIONS, generations
+from app.utils.routing import read_only
+from app.utils.token_cache import token_cache
 
 
 class UserRepository(BaseRepository):
     """Class to work with db related operations"""
 
-    def __init__(self, session: Session):
+    def __init__(self, session: DbSession):
         super().__init__(session)
 
-    def register(self, user: UserModel) -> bool:
-        """Register user if not exists"""
+    def register(self, user: UserModel, password_hash: str) -> bool:
+        """Register user with the hashed password if not exists"""
         db_record = (
             self._session.query(UserTable)
             .where(UserTable.email == user.username)
@@ -37,7 +41,7 @@ class UserRepository(BaseRepository):
         if db_record is None:
             user_rec = UserTable()
             user_rec.email = user.username
-            user_rec.password = bcrypt.hash(user.password)
+            user_rec.password = password_hash
 
             self._session.add(user_rec)
             self._session.commit()
@@ -70,14 +74,69 @@ class UserRepository(BaseRepository):
 
         return None
 
-    def is_password_correct(self, form_date: OAuth2PasswordRequestForm = Depends()):
-        """Check if user exists for the given password"""
-        user = self.get_user(form_date.username)
-        pwd_context = get_pwd_context()
+    def get_login_state(self, username: str) -> Optional[LoginStateModel]:
+        """User with the stored password hash and session token, in one query"""
+        row = self._session.execute(
+            select(
+                UserTable.id,
+                UserTable.email,
+                UserTable.password,
+                UserTokenTable.token,
+                UserTokenTable.expiry_time,
+            )
+            .outerjoin(UserTokenTable, UserTokenTable.username == UserTable.email)
+            .where(UserTable.email == username)
+        ).first()
+        if row is None:
+            return None
 
-        if user is None or not pwd_context.verify(form_date.password, user.password):
-            return False
-        return True
+        return LoginStateModel(
+            user_id=row.id,
+            username=row.email,
+            password=row.password,
+            access_token=row.token,
+            expiry_time=row.expiry_time,
+        )
+
+    def start_session(self, user_id: int, username: str) -> str:
+        """Issues a new access token and upserts the user session row in one statement"""
+        expiry_time = datetime.utcnow() + timedelta(minutes=30)
+        token = self.generate_token(data={"sub": username}, expiry_delta=expiry_time)
+
+        values = {"user_id": user_id, "username": username, "token": token, "expiry_time": expiry_time}
+        self._session.execute(self._upsert_session_statement(values))
+        self._session.commit()
+        generations.bump(SESSIONS)
+
+        return token
+
+    def _upsert_session_statement(self, values: dict):
+        """Insert of the session row, updating the existing row of the user"""
+        dialect = self._session.get_bind().dialect.name
+        if dialect == "mysql":
+            statement = mysql_insert(UserTokenTable).values(**values)
+            return statement.on_duplicate_key_update(
+                user_id=statement.inserted.user_id,
+                token=statement.inserted.token,
+                expiry_time=statement.inserted.expiry_time,
+            )
+
+        statement = sqlite_insert(UserTokenTable).values(**values)
+        return statement.on_conflict_do_update(
+            index_elements=[UserTokenTable.username],
+            set_={
+                "user_id": statement.excluded.user_id,
+                "token": statement.excluded.token,
+                "expiry_time": statement.excluded.expiry_time,
+            },
+        )
+
+    def update_password(self, username: str, password_hash: str):
+        """Stores a new hash of the user password"""
+        self._session.query(UserTable).where(UserTable.email == username).update(
+            {UserTable.password: password_hash}, synchronize_session=False
+        )
+        self._session.commit()
 
     def get_access_token(self, form_data: OAuth2PasswordRequestForm = Depends()):
         """Get access token for the requested user"""
@@ -87,6 +146,7 @@ class UserRepository(BaseRepository):
         )
         return access_token
 
+    @read_only
     def authenticate(self, token: str) -> UserInRequestModel:
         """Authenticate user based on token
         :param token access token
@@ -115,21 +175,10 @@ class UserRepository(BaseRepository):
                     detail="Login failed or expired",
                 )
 
-            # Check feasibility of using session
-            if not isinstance(self._session, Session):
-                conn = get_connection()
-                with conn.begin() as connection:
-                    active_session = connection.execute(
-                        select(UserTokenTable).where(
-                            UserTokenTable.username == username
-                        )
-                    ).first()
-            else:
-                active_session = (
-                    self._session.query(UserTokenTable)
-                    .where(UserTokenTable.username == username)
-                    .first()
-                )
+            active_session = self._active_session(username)
+            if active_session is None and self.use_primary():
+                # a session started beyond the replica lag bound, only the primary tells it does not exist
+                active_session = self._active_session(username)
 
             if active_session is None:
                 raise HTTPException(
@@ -142,6 +191,7 @@ class UserRepository(BaseRepository):
                 username=active_session.username,
                 token=token,
             )
+            token_cache.put(token, current_user, expiry_time)
 
         except JWTError:
             raise HTTPException(
@@ -151,6 +201,9 @@ class UserRepository(BaseRepository):
 
         return current_user
 
+    def _active_session(self, username: str) -> Optional[UserTokenTable]:
+        return self._session.query(UserTokenTable).where(UserTokenTable.username == username).first()
+
     def register_token_in_session(self, token: str):
         """Registers token in session"""
         try:
@@ -175,8 +228,13 @@ class UserRepository(BaseRepository):
                 user_id=user_id, username=user, token=token, expiry_time=exp_time
             )
 
+            # one session row per user, replaces an expired one
+            self._session.query(UserTokenTable).where(UserTokenTable.username == user).delete(
+                synchronize_session=False
+            )
             self._session.add(user_token)
             self._session.commit()
+            generations.bump(SESSIONS)
 
             # if result is not None:
             return active_session
@@ -246,5 +304,25 @@ class UserRepository(BaseRepository):
         if db_user is not None:
             self._session.delete(db_user)
             self._session.commit()
+        # after the commit, so no worker re-caches the token from the old row
+        token_cache.evict(token)
 
         return True
+
+    def delete_expired_tokens(self, now: datetime, batch_size: int) -> int:
+        """Deletes one batch of session tokens expired before now, returns the rows deleted"""
+        expired = self._session.execute(
+            select(UserTokenTable.id)
+            .where(UserTokenTable.expiry_time < now)
+            .order_by(UserTokenTable.expiry_time)
+            .limit(batch_size)
+        ).scalars().all()
+        deleted = 0
+        if expired:
+            # re-checks the expiry, a login may have refreshed the row meanwhile
+            deleted = self._session.execute(
+                delete(UserTokenTable).where(UserTokenTable.id.in_(expired), UserTokenTable.expiry_time < now),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+        self._session.commit()
+        return deleted
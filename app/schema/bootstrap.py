@@ -0,0 +1,75 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Connection
+
+from app.schema import post, user, user_token  # noqa: F401 register tables
+from app.utils.dependencies import DbBase, get_db_url
+from app.utils.logger import get_logger, log_pipeline
+
+logger = get_logger(__name__)
+
+# keeps the newest row per key before a unique index is added on it
+DEDUPE_STATEMENTS = {
+    "ix_user_tokens_username": (
+        "DELETE FROM user_tokens WHERE id NOT IN "
+        "(SELECT id FROM (SELECT MAX(id) AS id FROM user_tokens GROUP BY username) AS latest)"
+    ),
+    "ix_user_tokens_token": (
+        "DELETE FROM user_tokens WHERE id NOT IN "
+        "(SELECT id FROM (SELECT MAX(id) AS id FROM user_tokens GROUP BY token) AS latest)"
+    ),
+}
+
+
+def _indexed_columns(inspector, table_name: str) -> tuple[set, set]:
+    """Column sets already covered by any index or unique constraint, and those covered by a unique one"""
+    indexes = inspector.get_indexes(table_name)
+    unique = {tuple(ix["column_names"]) for ix in indexes if ix["unique"]}
+    unique.update(tuple(uq["column_names"]) for uq in inspector.get_unique_constraints(table_name))
+    covered = unique | {tuple(ix["column_names"]) for ix in indexes}
+    return covered, unique
+
+
+def bootstrap_schema(connection: Connection) -> list[str]:
+    """Creates missing tables and indexes
+    :param connection open connection, committed by the caller
+    :returns names of the created tables and indexes
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in DbBase.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            table.create(connection)
+            created.append(table.name)
+            continue
+
+        covered, unique = _indexed_columns(inspector, table.name)
+        index_names = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            # a plain index does not back the upserts relying on a unique key
+            if tuple(column.name for column in index.columns) in (unique if index.unique else covered):
+                continue
+            if index.unique and index.name in DEDUPE_STATEMENTS:
+                connection.execute(text(DEDUPE_STATEMENTS[index.name]))
+            if index.name in index_names:
+                # a non unique index of the same name, replaced by the unique one
+                index.drop(connection)
+            index.create(connection)
+            created.append(index.name)
+
+    return created
+
+
+def main():
+    """Bootstraps the configured database: python -m app.schema.bootstrap"""
+    log_pipeline.start()
+    engine = create_engine(get_db_url())
+    with engine.begin() as connection:
+        created = bootstrap_schema(connection)
+    engine.dispose()
+    logger.info(f"Schema bootstrap created: {', '.join(created) or 'nothing, schema is up to date'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.models.post_model import AddPostModel
+from app.models.user_model import UserModel
+from app.repositories.post_repository import PostRepository
+from app.repositories.user_repository import UserRepository
+from app.schema.bootstrap import bootstrap_schema
+from app.utils.logger import get_logger, log_pipeline
+
+logger = get_logger(__name__)
+
+# statements worth checking, inserts never scan
+CHECKED_VERBS = ("SELECT", "UPDATE", "DELETE")
+
+
+def exercise_repositories(engine: Engine):
+    """Calls every repository method that reaches the db"""
+    credentials = SimpleNamespace(username="plan@check.io", password="secret")
+
+    with Session(engine) as session:
+        users = UserRepository(session)
+        users.register(UserModel(username="other@check.io", password="secret"), "hash")
+        users.register(UserModel(username=credentials.username, password=credentials.password), "hash")
+        users.get_user(credentials.username)
+        users.update_password(credentials.username, "new hash")
+        login = users.get_login_state(credentials.username)
+        users.start_session(login.user_id, login.username)
+        users.is_active_session(credentials.username)
+
+        token = users.get_access_token(credentials)
+        active_session = users.register_token_in_session(token)
+        users.is_active_session(credentials.username)
+        users.get_active_access_token(credentials.username)
+        users.authenticate(token)
+
+        posts = PostRepository(session)
+        post_ids = [
+            posts.add_post(AddPostModel(title=f"plan check {i}", description="post"), active_session.user_id)
+            for i in range(3)
+        ]
+        posts.add_posts([(0, AddPostModel(title="plan check bulk", description="post"))], active_session.user_id)
+        posts.get_list()
+        posts.get_list(after_id=post_ids[0], limit=1)
+        posts.get_list(after_id=post_ids[0], limit=1, user_id=active_session.user_id)
+        posts.get_by_ids(post_ids)
+        posts.delete_post(post_ids[-1])
+        posts.delete_posts(post_ids[:2], active_session.user_id)
+
+        # as seen from an hour later, so the session token has expired
+        users.delete_expired_tokens(datetime.utcnow() + timedelta(hours=1), 100)
+        users.logout(token)
+
+
+def collect_statements(engine: Engine) -> list[tuple[str, tuple]]:
+    """Distinct statements issued by the repositories, with sample parameters"""
+    statements = {}
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(CHECKED_VERBS) and not executemany:
+            statements.setdefault(statement, parameters)
+
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        exercise_repositories(engine)
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+
+    return list(statements.items())
+
+
+def find_full_scans(engine: Engine) -> list[tuple[str, list[str]]]:
+    """Statements whose SQLite query plan scans a whole table"""
+    failures = []
+    with engine.connect() as connection:
+        for statement, parameters in collect_statements(engine):
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            details = [row[-1] for row in plan]
+            logger.info(f"{statement}\n\t -> {'; '.join(details)}")
+            if any(detail.startswith("SCAN ") for detail in details):
+                failures.append((statement, details))
+
+    return failures
+
+
+def main():
+    """Query plan regression check on a SQLite stand-in: python -m app.schema.plan_check"""
+    log_pipeline.start()
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as connection:
+        bootstrap_schema(connection)
+
+    failures = find_full_scans(engine)
+    engine.dispose()
+    for statement, details in failures:
+        logger.error(f"Full table scan: {statement}\n\t -> {'; '.join(details)}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,9 @@ from sqlalchemy.orm import relationship
 
 from app.models.post_model import ShowPostsModel
 from app.utils.dependencies import DbBase
-from app.utils.logger import logger
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 class PostTable(DbBase):
@@ -12,7 +14,7 @@ class PostTable(DbBase):
     id = Column(INTEGER, primary_key=True, autoincrement=True)
     title = Column(String(50), nullable=False)
     description = Column(String(150), nullable=False)
-    user_id = Column(INTEGER, ForeignKey("users.id"))
+    user_id = Column(INTEGER, ForeignKey("users.id"), index=True)
 
     # relations
     user = relationship("UserTable", back_populates="posts")
@@ -11,8 +11,8 @@ class UserTable(DbBase):
     __tablename__ = "users"
 
     id = Column(INTEGER, primary_key=True, nullable=False, autoincrement=True)
-    email = Column(String, nullable=False, unique=True)
-    password = Column(String, nullable=False)
+    email = Column(String(255), nullable=False, unique=True, index=True)
+    password = Column(String(255), nullable=False)
 
     # relationship
     posts = relationship("PostTable", back_populates="user")
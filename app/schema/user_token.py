@@ -8,6 +8,7 @@ class UserTokenTable(DbBase):
 
     id = Column(INTEGER, primary_key=True, autoincrement=True)
     user_id = Column(INTEGER, nullable=False)
-    username = Column(String, nullable=False)
-    token = Column(String, nullable=False)
-    expiry_time = Column(DATETIME, nullable=True)
+    username = Column(String(255), nullable=False, unique=True, index=True)
+    token = Column(String(512), nullable=False, unique=True, index=True)
+    # range scanned by the expired token sweeper
+    expiry_time = Column(DATETIME, nullable=True, index=True)
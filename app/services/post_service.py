@@ -1,21 +1,151 @@
-from sqlalchemy.orm import Session
+from typing import AsyncIterator, Optional
 
-from app.models.post_model import AddPostModel
+from pydantic import ValidationError
+
+from app.config.settings import PostSettings, SearchSettings
+from app.models.post_model import AddPostModel, BulkPostErrorModel, BulkPostResultModel, SearchPostsResultModel
 from app.repositories.post_repository import PostRepository
+from app.utils.dependencies import DbSession
+from app.utils.generations import POSTS
+from app.utils.post_cache import post_list_cache, user_feed_cache
+from app.utils.query_tracker import untracked
+from app.utils.search_index import post_search_index
+
+# ids below the newest indexed one re-read on catch up, for inserts of other workers committing out of id order
+SEARCH_CATCH_UP_OVERLAP = 100
+
+
+def validation_message(ex: ValidationError) -> str:
+    """Field and message of every error, without the model internals"""
+    return "; ".join(f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in ex.errors())
 
 
 class PostService:
-    def __init__(self, session: Session):
+    def __init__(self, session: DbSession):
         self.repo = PostRepository(session)
 
-    def get_posts(self) -> list:
-        """Get list of all posts"""
-        return self.repo.get_list()
+    async def get_posts(self, after_id: int = 0, limit: int = PostSettings.list_default_limit) -> list:
+        """Get a page of posts after the given cursor, served from the shared cache"""
+        return await post_list_cache.get_or_load((after_id, limit), lambda: self._load_cached(after_id, limit))
+
+    async def _load_cached(self, after_id: int, limit: int, user_id: Optional[int] = None) -> list:
+        """Page read for a cache, from the primary right after a post write a replica may miss"""
+        self.repo.use_primary_after_write(POSTS)
+        return await self.repo.run(self.repo.get_list, after_id, limit, user_id)
+
+    async def get_user_posts(self, user_id: int, after_id: int = 0,
+                             limit: int = PostSettings.list_default_limit) -> list:
+        """Get a page of one user's posts, served from the user's materialized feed when it fits"""
+        page = user_feed_cache.get_page(user_id, after_id, limit)
+        if page is not None:
+            return page
+
+        if not user_feed_cache.is_oversized(user_id):
+            version = user_feed_cache.version
+            posts = await self._load_cached(0, user_feed_cache.max_posts + 1, user_id)
+            if user_feed_cache.fill(user_id, posts, version):
+                return user_feed_cache.get_page(user_id, after_id, limit)
+
+        return await self.repo.run(self.repo.get_list, after_id, limit, user_id)
+
+    def get_posts_etag(self, after_id: int, limit: int, user_id: Optional[int] = None) -> str:
+        """Strong ETag of a posts page, changes whenever posts are written"""
+        return f'"posts-{post_list_cache.epoch}-{post_list_cache.version}-{user_id or 0}-{after_id}-{limit}"'
+
+    async def iter_posts(self, after_id: int = 0, chunk_size: int = PostSettings.stream_chunk_size,
+                         user_id: Optional[int] = None) -> AsyncIterator[list]:
+        """Yield every post, or every post of one user, after the cursor, one keyset page at a time"""
+        while True:
+            chunk = await self.repo.run(self.repo.get_list, after_id, chunk_size, user_id)
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                break
+            after_id = chunk[-1].id
 
-    def add_new_post(self, post_model: AddPostModel, user_id: int) -> int:
+    async def search_posts(self, query: str, offset: int = 0,
+                           limit: int = SearchSettings.default_limit) -> SearchPostsResultModel:
+        """Ranked page of posts matching the query, from the in-process index"""
+        if post_search_index.ready and post_search_index.is_behind():
+            await self.catch_up_search_index()
+        total, post_ids = post_search_index.search(query, offset, limit)
+        posts = await self.repo.run(self.repo.get_by_ids, post_ids)
+        if len(posts) < len(post_ids) and self.repo.use_primary():
+            # a lagging replica may not have them yet, only the primary tells they were removed
+            posts = await self.repo.run(self.repo.get_by_ids, post_ids)
+        if len(posts) < len(post_ids):
+            # removed by another worker, drop them from the index
+            found = {post.id for post in posts}
+            for post_id in post_ids:
+                if post_id not in found:
+                    post_search_index.remove(post_id)
+            total -= len(post_ids) - len(posts)
+        return SearchPostsResultModel.construct(total=total, posts=posts)
+
+    async def catch_up_search_index(self):
+        """Indexes the posts added by other workers since the newest indexed one"""
+        # the posts that moved the generation may not have reached a replica yet
+        self.repo.use_primary_after_write(POSTS)
+        post_search_index.set_behind(False)
+        after_id = max(0, post_search_index.max_id - SEARCH_CATCH_UP_OVERLAP)
+        try:
+            # reads a variable number of chunks, not counted against the request budget
+            with untracked():
+                async for chunk in self.iter_posts(after_id):
+                    post_search_index.add_many(chunk)
+        except BaseException:
+            post_search_index.set_behind(True)
+            raise
+
+    async def build_search_index(self) -> int:
+        """Indexes every post, returns the number of posts indexed"""
+        self.repo.use_primary_after_write(POSTS)
+        post_search_index.clear()
+        async for chunk in self.iter_posts():
+            post_search_index.add_many(chunk)
+        post_search_index.ready = True
+        return len(post_search_index)
+
+    async def add_new_post(self, post_model: AddPostModel, user_id: int) -> int:
         """Adds new post"""
-        return self.repo.add_post(post_model, user_id)
+        return await self.repo.run(self.repo.add_post, post_model, user_id)
+
+    async def bulk_add_posts(self, items: AsyncIterator, user_id: int,
+                             chunk_size: int = PostSettings.bulk_chunk_size) -> BulkPostResultModel:
+        """Validates every item (dict or raw json line) and inserts the valid ones in chunks"""
+        result = BulkPostResultModel()
+        chunk = []
+
+        async def flush():
+            failures = await self.repo.run(self.repo.add_posts, chunk, user_id)
+            result.inserted += len(chunk) - len(failures)
+            result.failed.extend(BulkPostErrorModel(index=index, error=error) for index, error in failures)
+            chunk.clear()
 
-    def remove_post(self, post_id: int) -> bool:
+        index = 0
+        async for item in items:
+            try:
+                if isinstance(item, (str, bytes)):
+                    chunk.append((index, AddPostModel.parse_raw(item)))
+                else:
+                    chunk.append((index, AddPostModel.parse_obj(item)))
+            except ValidationError as ex:
+                result.failed.append(BulkPostErrorModel(index=index, error=validation_message(ex)))
+            index += 1
+
+            if len(chunk) >= chunk_size:
+                await flush()
+        if chunk:
+            await flush()
+
+        # validation failures are reported as read, insert failures chunk by chunk
+        result.failed.sort(key=lambda failure: failure.index)
+        return result
+
+    async def remove_post(self, post_id: int) -> bool:
         """Deletes the post"""
-        return self.repo.delete_post(post_id)
+        return await self.repo.run(self.repo.delete_post, post_id)
+
+    async def remove_posts(self, post_ids: list[int], user_id: int) -> list[int]:
+        """Deletes the user's posts among the ids, returns the removed ids"""
+        return await self.repo.run(self.repo.delete_posts, post_ids, user_id)
@@ -0,0 +1,102 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+from app.config.settings import TokenSweepSettings
+from app.services.user_service import UserService
+from app.utils.dependencies import engine_registry, close_session
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TokenSweeper:
+    """Background task purging expired rows of user_tokens
+
+    Every run deletes expired tokens in bounded batches, one transaction per
+    batch, and at most max_batches per run so a large backlog is worked off
+    over several runs without holding locks for long. Runs are spaced by the
+    interval with random jitter.
+    """
+
+    def __init__(self, interval: float, jitter: float, batch_size: int, max_batches: int):
+        self.interval = interval
+        self.jitter = jitter
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.errors = 0
+        self.purged = 0
+        self.last_purged = 0
+        self.last_duration = 0.0
+
+    def start(self):
+        """Starts the sweep loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="token-sweeper")
+            logger.info(f"Token sweeper started, every {self.interval:.0f}s, batches of {self.batch_size}")
+
+    async def stop(self):
+        """Cancels the sweep loop and waits for it to finish"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _next_delay(self) -> float:
+        """Interval with +/- jitter"""
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def _loop(self):
+        # first run at a random point of the interval, spreading workers started together
+        await asyncio.sleep(random.uniform(0, self.interval))
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                self.errors += 1
+                logger.error(f"Token sweep failed: {ex}")
+            await asyncio.sleep(self._next_delay())
+
+    async def sweep(self) -> int:
+        """One sweep, returns the rows purged"""
+        session = engine_registry.session()
+        started = time.perf_counter()
+        try:
+            purged = await UserService(session).purge_expired_tokens(self.batch_size, self.max_batches)
+        finally:
+            await close_session(session)
+
+        self.runs += 1
+        self.purged += purged
+        self.last_purged = purged
+        self.last_duration = time.perf_counter() - started
+        log = logger.info if purged else logger.debug
+        log(f"Token sweep purged {purged} expired tokens in {self.last_duration:.3f}s")
+        return purged
+
+    def stats(self) -> dict:
+        """Run counters"""
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "purged": self.purged,
+            "last_purged": self.last_purged,
+            "last_duration": self.last_duration,
+        }
+
+
+token_sweeper = TokenSweeper(
+    interval=TokenSweepSettings.interval,
+    jitter=TokenSweepSettings.jitter,
+    batch_size=TokenSweepSettings.batch_size,
+    max_batches=TokenSweepSettings.max_batches,
+)
@@ -1,47 +1,80 @@
+from datetime import datetime
+
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
 
 from app.models.token_model import Token
 from app.models.user_model import UserModel
 from app.repositories.user_repository import UserRepository
+from app.utils.dependencies import DbSession
+from app.utils.generations import SESSIONS, TOKENS
+from app.utils.hashing import password_hasher
 
 
 class UserService:
     """Business logic related to user mgmt"""
 
-    def __init__(self, session: Session):
+    def __init__(self, session: DbSession):
         self.user_repo = UserRepository(session)
 
-    def register(self, user: UserModel):
+    async def register(self, user: UserModel):
         """Registers user"""
-        return self.user_repo.register(user)
+        if await self.user_repo.run(self.user_repo.get_user, user.username) is not None:
+            return False
+
+        password_hash = await password_hasher.hash(user.password)
+        return await self.user_repo.run(self.user_repo.register, user, password_hash)
+
+    async def get_access_token(self, form_data: OAuth2PasswordRequestForm = Depends()):
+        """Get access token
+
+        One query loads the user with the session token, a second statement
+        upserts the session only when no unexpired token exists.
+        """
+        login = await self.user_repo.run(self.user_repo.get_login_state, form_data.username)
+        if login is None:
+            return Token(access_token=None, token_type="bearer")
 
-    def get_access_token(self, form_data: OAuth2PasswordRequestForm = Depends()):
-        """Get access token"""
-        if not self.user_repo.is_password_correct(form_data):
+        verified, new_hash = await password_hasher.verify(form_data.password, login.password)
+        if not verified:
             return Token(access_token=None, token_type="bearer")
-        if not self.user_repo.is_active_session(form_data.username):
-            access_token = self.user_repo.get_access_token(form_data)
-            if access_token is not None:
-                self.user_repo.register_token_in_session(access_token)
-                return Token(access_token=access_token, token_type="bearer")
 
-        access_token = self.user_repo.get_active_access_token(form_data.username)
+        if new_hash is not None:
+            # hashing cost changed since the password was stored
+            await self.user_repo.run(self.user_repo.update_password, login.username, new_hash)
+
+        # a session row without an expiry time counts as expired
+        expiry_time = login.expiry_time
+        if login.access_token is not None and expiry_time is not None and expiry_time > datetime.utcnow():
+            return Token(access_token=login.access_token, token_type="bearer")
+
+        access_token = await self.user_repo.run(self.user_repo.start_session, login.user_id, login.username)
         return Token(access_token=access_token, token_type="bearer")
 
-    def authenticate(self, token: str):
-        """Authenticate token"""
-        return self.user_repo.authenticate(token)
+    async def authenticate(self, token: str):
+        """Authenticate token, on a replica unless a session was started or ended within its lag"""
+        self.user_repo.use_primary_after_write(TOKENS, SESSIONS)
+        return await self.user_repo.run(self.user_repo.authenticate, token)
 
-    def register_token_in_session(self, token: str):
+    async def register_token_in_session(self, token: str):
         """Active session registration"""
-        return self.user_repo.register_token_in_session(token)
+        return await self.user_repo.run(self.user_repo.register_token_in_session, token)
 
-    def logout(self, token: str):
+    async def logout(self, token: str):
         """Logout"""
-        return self.user_repo.logout(token)
+        return await self.user_repo.run(self.user_repo.logout, token)
 
-    def is_session_active(self, user_name: str):
+    async def is_session_active(self, user_name: str):
         """Active?"""
-        return self.user_repo.is_active_session(user_name)
+        return await self.user_repo.run(self.user_repo.is_active_session, user_name)
+
+    async def purge_expired_tokens(self, batch_size: int, max_batches: int) -> int:
+        """Deletes expired session tokens batch by batch, returns the rows deleted"""
+        now = datetime.utcnow()
+        purged = 0
+        for _ in range(max_batches):
+            deleted = await self.user_repo.run(self.user_repo.delete_expired_tokens, now, batch_size)
+            purged += deleted
+            if deleted < batch_size:
+                break
+        return purged
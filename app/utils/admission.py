@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Hashable, Optional
+
+from cachetools import LRUCache
+
+from app.config.settings import AdmissionSettings
+
+
+class TokenBuckets:
+    """Token bucket per key, refilled with ``rate`` tokens a second up to ``burst``
+
+    Buckets live in a bounded LRU: a key dropped for size starts over with a
+    full bucket. Only used from the event loop, so no lock.
+    """
+
+    def __init__(self, rate: float, burst: int, maxsize: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = LRUCache(maxsize=maxsize)
+
+    def take(self, key: Hashable) -> float:
+        """Takes a token, returns 0 when there was one or else the seconds until the next one"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class ConcurrencyLimiter:
+    """At most ``limit`` requests at once, ``queue_size`` more wait up to ``timeout`` seconds for a slot"""
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+
+    async def acquire(self) -> Optional[str]:
+        """Takes a slot, returns the rejection reason when none is free in time"""
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                return "queue_full"
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return "queue_timeout"
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        return None
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+class AdmissionControl:
+    """Per client rate limits and per route class concurrency caps of one worker
+
+    Rejections are counted by reason and route class for /metrics.
+    """
+
+    def __init__(self, ip_rate: float, ip_burst: int, user_rate: float, user_burst: int, tracked_clients: int,
+                 concurrency: dict[str, int], queue_size: int, queue_timeout: float):
+        self.ip_buckets = TokenBuckets(ip_rate, ip_burst, tracked_clients) if ip_rate > 0 else None
+        self.user_buckets = TokenBuckets(user_rate, user_burst, tracked_clients) if user_rate > 0 else None
+        self.limiters = {
+            route_class: ConcurrencyLimiter(limit, queue_size, queue_timeout)
+            for route_class, limit in concurrency.items() if limit > 0
+        }
+        self.rejected: Counter = Counter()
+
+    def check_ip(self, client_ip: str) -> float:
+        """Takes a token of the ip, returns 0 or the seconds until it has one"""
+        return self.ip_buckets.take(client_ip) if self.ip_buckets is not None else 0.0
+
+    def check_user(self, user_id: int) -> float:
+        """Takes a token of the user, returns 0 or the seconds until they have one"""
+        return self.user_buckets.take(user_id) if self.user_buckets is not None else 0.0
+
+    def limiter(self, route_class: str) -> Optional[ConcurrencyLimiter]:
+        return self.limiters.get(route_class)
+
+    def reject(self, reason: str, route_class: str):
+        self.rejected[(reason, route_class)] += 1
+
+    def stats(self) -> dict:
+        """Rejections by (reason, route class), and in-flight and waiting requests by route class"""
+        return {
+            "rejected": dict(self.rejected),
+            "active": {route_class: limiter.active for route_class, limiter in self.limiters.items()},
+            "waiting": {route_class: limiter.waiting for route_class, limiter in self.limiters.items()},
+        }
+
+
+admission_control = AdmissionControl(
+    ip_rate=AdmissionSettings.ip_rate,
+    ip_burst=AdmissionSettings.ip_burst,
+    user_rate=AdmissionSettings.user_rate,
+    user_burst=AdmissionSettings.user_burst,
+    tracked_clients=AdmissionSettings.tracked_clients,
+    concurrency=AdmissionSettings.concurrency,
+    queue_size=AdmissionSettings.queue_size,
+    queue_timeout=AdmissionSettings.queue_timeout,
+)
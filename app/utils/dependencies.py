@@ -1,55 +1,278 @@
+import threading
+from typing import Any, Callable, Optional, Union
+
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.engine.url import URL
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
+from starlette.concurrency import run_in_threadpool
+
+from app.config.settings import DbSettings, HashSettings
+from app.utils.hashing import get_crypt_context
+from app.utils.logger import get_logger
+from app.utils.routing import RoutingSession, replica_pool
 
-from app.config.settings import DbSettings
-from app.utils.logger import logger
+logger = get_logger(__name__)
 
 DbBase = declarative_base()
 
+DbSession = Union[Session, AsyncSession]
 
-def get_connection() -> Engine:
-    """Gets connection from db"""
-    uri = URL.create(
-        "mysql+pymysql",
+DRIVERS = {
+    ("mysql", False): "mysql+pymysql",
+    ("mysql", True): "mysql+aiomysql",
+    ("sqlite", False): "sqlite",
+    ("sqlite", True): "sqlite+aiosqlite",
+}
+
+
+def get_db_url(use_async: bool = False, replica: Optional[str] = None) -> URL:
+    """Database url built from settings, of the primary or of one of DB_REPLICAS"""
+    drivername = DRIVERS[(DbSettings.dialect, use_async)]
+    if DbSettings.dialect == "sqlite":
+        return URL.create(drivername, database=replica or DbSettings.dbname)
+
+    host, port = DbSettings.host, DbSettings.port
+    if replica:
+        host, _, replica_port = replica.partition(":")
+        port = replica_port or port
+    return URL.create(
+        drivername,
         username=DbSettings.user,
         password=DbSettings.passwd,  # plain (unescaped) text
-        host=DbSettings.host,
+        host=host,
         database=DbSettings.dbname,
-        port=DbSettings.port
+        port=int(port)
     )
 
-    db_engine = create_engine(uri)
-    return db_engine
 
+def get_engine_options() -> dict:
+    """Connection pool options for the engine"""
+    options = {
+        "pool_recycle": DbSettings.pool_recycle,
+        "pool_pre_ping": DbSettings.pool_pre_ping,
+    }
+    # in-memory sqlite runs on a single connection pool without sizing
+    if DbSettings.dbname != ":memory:":
+        options.update(
+            pool_size=DbSettings.pool_size,
+            max_overflow=DbSettings.max_overflow,
+            pool_timeout=DbSettings.pool_timeout,
+        )
+    return options
+
+
+class EngineRegistry:
+    """Process wide registry of the pooled db engines
+
+    The engines (and their connection pools) are created once, from the app
+    lifespan, and shared by every request instead of being rebuilt per session.
+    With DB_ASYNC enabled sessions are AsyncSession objects on an async driver.
+    Sessions are routing sessions: with DB_REPLICAS set, read only repository
+    methods are served by the replicas (see app.utils.routing).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine: Optional[Engine] = None
+        self._async_engine: Optional[AsyncEngine] = None
+        self._replicas: list[Union[Engine, AsyncEngine]] = []
+        self._session_maker: Optional[Union[sessionmaker, async_sessionmaker]] = None
+        self._checkouts = 0
+        self._connects = 0
+
+    @property
+    def use_async(self) -> bool:
+        return DbSettings.use_async
+
+    def start(self) -> Engine:
+        """Creates the pooled engine if not created yet"""
+        with self._lock:
+            if self._engine is None:
+                if self.use_async:
+                    self._async_engine = create_async_engine(get_db_url(use_async=True), **get_engine_options())
+                    engine = self._async_engine.sync_engine
+                    self._replicas = [
+                        create_async_engine(get_db_url(True, replica), **get_engine_options())
+                        for replica in DbSettings.replicas
+                    ]
+                    self._session_maker = async_sessionmaker(
+                        autoflush=False, bind=self._async_engine, expire_on_commit=True,
+                        sync_session_class=RoutingSession,
+                    )
+                else:
+                    engine = create_engine(get_db_url(), **get_engine_options())
+                    self._replicas = [
+                        create_engine(get_db_url(replica=replica), **get_engine_options())
+                        for replica in DbSettings.replicas
+                    ]
+                    self._session_maker = sessionmaker(
+                        autoflush=False, bind=engine, expire_on_commit=True, class_=RoutingSession
+                    )
+                if self._replicas:
+                    replica_pool.configure(
+                        self.replica_engines, DbSettings.replica_eject_seconds, DbSettings.replica_max_lag
+                    )
+
+                event.listen(engine, "connect", self._on_connect)
+                event.listen(engine, "checkout", self._on_checkout)
+                self._engine = engine
+                logger.info(
+                    f"DB engine created for {engine.url.drivername} with pool_size={DbSettings.pool_size}, "
+                    f"max_overflow={DbSettings.max_overflow}, replicas={len(self._replicas)}"
+                )
+
+        return self._engine
+
+    @property
+    def replica_engines(self) -> list[Engine]:
+        """Sync engines of the read replicas"""
+        return [getattr(replica, "sync_engine", replica) for replica in self._replicas]
+
+    @property
+    def engines(self) -> list[Engine]:
+        """Sync engines of the primary and every replica"""
+        return [self.engine] + self.replica_engines
+
+    @property
+    def engine(self) -> Engine:
+        """Pooled (sync) engine, created on first use when lifespan did not run"""
+        return self._engine or self.start()
+
+    def session(self) -> DbSession:
+        """New session bound to the pooled engine"""
+        if self._session_maker is None:
+            self.start()
+        return self._session_maker()
+
+    async def run_sync(self, fn: Callable[[Connection], Any]) -> Any:
+        """Runs fn(connection) in a transaction without blocking the event loop"""
+        if self._async_engine is not None:
+            async with self._async_engine.begin() as connection:
+                return await connection.run_sync(fn)
+
+        def _run():
+            with self.engine.begin() as connection:
+                return fn(connection)
 
-def get_db() -> Session:
-    """Gets db object for the new connection"""
+        return await run_in_threadpool(_run)
+
+    async def warm_up(self, connections: int) -> int:
+        """Opens pooled connections ahead of the first requests, returns how many"""
+        connections = max(1, min(connections, DbSettings.pool_size))
+        if self._async_engine is not None:
+            await self._warm_up_async(self._async_engine, connections)
+            for replica in self._replicas:
+                await self._warm_up_async(replica, connections, replica=True)
+            return connections
+
+        def _open(engine: Engine, replica: bool = False):
+            try:
+                opened = [engine.connect() for _ in range(connections)]
+            except SQLAlchemyError as ex:
+                if not replica:
+                    raise
+                # ejected by now, served by the other replicas or the primary
+                logger.warning(f"Replica warm-up failed: {ex}")
+                return
+            for connection in opened:
+                connection.close()
+
+        await run_in_threadpool(_open, self.engine)
+        for replica in self._replicas:
+            await run_in_threadpool(_open, replica, True)
+        return connections
+
+    @staticmethod
+    async def _warm_up_async(engine: AsyncEngine, connections: int, replica: bool = False):
+        try:
+            opened = [await engine.connect() for _ in range(connections)]
+        except SQLAlchemyError as ex:
+            if not replica:
+                raise
+            logger.warning(f"Replica warm-up failed: {ex}")
+            return
+        for connection in opened:
+            await connection.close()
+
+    def pool_stats(self) -> dict:
+        """Connection pool checkout/overflow statistics"""
+        stats = {"connects": self._connects, "checkouts": self._checkouts}
+        if self._engine is None:
+            return stats
+
+        pool = self._engine.pool
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            method = getattr(pool, name, None)
+            if method is not None:
+                stats[name] = method()
+        return stats
+
+    async def dispose(self):
+        """Closes every pooled connection"""
+        for engine in [self._async_engine or self._engine] + self._replicas:
+            if isinstance(engine, AsyncEngine):
+                await engine.dispose()
+            elif engine is not None:
+                engine.dispose()
+
+        with self._lock:
+            if self._engine is not None:
+                logger.info(f"DB engine disposed, pool stats {self.pool_stats()}")
+            replica_pool.clear()
+            self._engine = None
+            self._async_engine = None
+            self._replicas = []
+            self._session_maker = None
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self._connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self._checkouts += 1
+
+
+engine_registry = EngineRegistry()
+
+
+def get_connection() -> Engine:
+    """Gets the pooled db engine"""
+    return engine_registry.engine
+
+
+async def close_session(session: DbSession):
+    """Returns the session connection to the pool without blocking the loop"""
+    if isinstance(session, AsyncSession):
+        await session.close()
+    else:
+        await run_in_threadpool(session.close)
+
+
+async def get_db() -> DbSession:
+    """Gets db session from the pooled engine"""
+    session_local: Optional[DbSession] = None
     try:
-        engine = get_connection()
-        session_maker = sessionmaker(
-            autoflush=False, bind=engine, expire_on_commit=True
-        )
-        session_local: Session = session_maker()
+        session_local = engine_registry.session()
         yield session_local
 
-    except Exception as e:
+    except SQLAlchemyError as e:
         logger.error(e)
         logger.error("Error occurred while establishing connection")
+        raise
 
     finally:
-        # close connection
-        if session_local:
-            session_local.close()
+        # return connection to the pool
+        if session_local is not None:
+            await close_session(session_local)
 
 
 def get_pwd_context() -> CryptContext:
-    """Get password context for bcrypt"""
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    return pwd_context
+    """Get the cached password context for bcrypt"""
+    return get_crypt_context(HashSettings.rounds)
 
 
 def get_oauth_scheme() -> OAuth2PasswordBearer:
@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+from typing import Optional
+
+POSTS = 0
+TOKENS = 1
+# sessions started, only their write time is looked at
+SESSIONS = 2
+CHANNELS = {"posts": POSTS, "tokens": TOKENS, "sessions": SESSIONS}
+# slot 0 holds the epoch, then one generation slot per channel, then one write time slot per channel
+SLOTS = 1 + 2 * len(CHANNELS)
+
+
+def new_epoch() -> int:
+    return random.getrandbits(48)
+
+
+def init_counters(counters):
+    """New epoch, and every channel written now: a write just before the launch may not have reached the replicas"""
+    counters[0] = new_epoch()
+    now = time.monotonic_ns()
+    for channel in range(len(CHANNELS)):
+        counters[1 + len(CHANNELS) + channel] = now
+
+
+class Generations:
+    """Invalidation generation per channel, shared by the workers of one launcher
+
+    A write bumps the generation of its channel; caches compare the generation
+    with the one they last saw and drop what they hold when another process
+    moved it. Standalone processes count in local memory; workers started by
+    app.launcher attach a shared-memory array created by the launcher, so a
+    bump in one worker is seen by every other one on its next cache read. The
+    time of the last bump tells whether the replicas may still miss the write.
+    """
+
+    def __init__(self):
+        self._counters = [0] * SLOTS
+        init_counters(self._counters)
+        self._lock = threading.Lock()
+        self.shared = False
+
+    def attach(self, counters, lock):
+        """Uses the launcher's shared array (multiprocessing RawArray of SLOTS uint64) and lock"""
+        self._counters = counters
+        self._lock = lock
+        self.shared = True
+
+    @property
+    def epoch(self) -> str:
+        """Tells generations of different launches (or standalone processes) apart"""
+        return format(self._counters[0], "x")
+
+    def get(self, channel: int) -> int:
+        # an aligned 8 byte read, no lock needed
+        return self._counters[1 + channel]
+
+    def bump(self, channel: int) -> int:
+        """Moves the channel to a new generation, returns it"""
+        with self._lock:
+            generation = self._counters[1 + channel] + 1
+            self._counters[1 + channel] = generation
+            self._counters[1 + len(CHANNELS) + channel] = time.monotonic_ns()
+        return generation
+
+    def seconds_since_write(self, channel: int) -> float:
+        """Seconds since the channel's last bump, or since the launch"""
+        # the monotonic clock is system wide, comparable between the workers
+        return (time.monotonic_ns() - self._counters[1 + len(CHANNELS) + channel]) / 1e9
+
+
+class GenerationTracker:
+    """Last generation of a channel seen by one cache
+
+    ``sync`` tells the cache to drop its content when another process (or an
+    unreported write) moved the generation; ``own_write`` records a write the
+    cache applies itself, which keeps its content unless other writes came in
+    between.
+    """
+
+    def __init__(self, generations: Generations, channel: int):
+        self._generations = generations
+        self._channel = channel
+        self._lock = threading.Lock()
+        self._seen: Optional[int] = None
+
+    def sync(self) -> bool:
+        """True when the generation moved since last seen"""
+        generation = self._generations.get(self._channel)
+        if generation == self._seen:
+            return False
+        with self._lock:
+            changed = self._seen is not None and generation != self._seen
+            self._seen = max(generation, self._seen or 0)
+        return changed
+
+    def own_write(self, generation: int) -> bool:
+        """Records the write that produced the generation, True when others wrote in between"""
+        with self._lock:
+            seen = self._seen or 0
+            if generation <= seen:
+                # an earlier own write reported late, already accounted for
+                return False
+            self._seen = generation
+            return generation != seen + 1
+
+
+generations = Generations()
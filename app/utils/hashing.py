@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config.settings import HashSettings
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# the pool starts after the log writer thread and the db engine exist, forked workers would
+# inherit their locks and sockets
+_spawn = multiprocessing.get_context("spawn")
+
+
+@lru_cache(maxsize=None)
+def get_crypt_context(rounds: int) -> CryptContext:
+    """Bcrypt context for the cost, built once per process
+
+    Hashes made with any other cost report ``needs_update`` and are rehashed on login.
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    return get_crypt_context(rounds).hash(password)
+
+
+def _verify_password(password: str, password_hash: str, rounds: int) -> tuple[bool, Optional[str]]:
+    return get_crypt_context(rounds).verify_and_update(password, password_hash)
+
+
+def _warm_up_worker(rounds: int) -> bool:
+    """Builds the context and loads the bcrypt backend, which passlib does on the first hash"""
+    get_crypt_context(rounds)
+    get_crypt_context(4).hash("warm-up")
+    return True
+
+
+class PasswordHasher:
+    """Runs bcrypt on a process pool so hashing never blocks the event loop
+
+    At most ``max_pending`` calls wait for the pool, more are rejected with 503.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self._workers = workers
+        self._max_pending = max_pending
+        self._rounds = rounds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.rejected = 0
+
+    def start(self):
+        """Creates the worker pool"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._workers, mp_context=_spawn)
+            logger.info(f"Password hashing pool started with {self._workers} workers, cost {self._rounds}")
+
+    async def warm_up(self):
+        """Starts every worker process with its crypt context ready"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _warm_up_worker, self._rounds) for _ in range(self._workers))
+        )
+
+    def shutdown(self):
+        """Stops the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def hash(self, password: str) -> str:
+        """Bcrypt hash of the password"""
+        return await self._submit(_hash_password, password, self._rounds)
+
+    async def verify(self, password: str, password_hash: str) -> tuple[bool, Optional[str]]:
+        """Verifies the password
+        :returns (verified, new hash when the stored one uses another cost)
+        """
+        return await self._submit(_verify_password, password, password_hash, self._rounds)
+
+    async def _submit(self, fn, *args) -> Any:
+        if self._pending >= self._max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, try again",
+                headers={"Retry-After": str(HashSettings.retry_after)},
+            )
+
+        self.start()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        """Queue depth and rejections"""
+        return {"pending": self._pending, "max_pending": self._max_pending, "rejected": self.rejected}
+
+
+password_hasher = PasswordHasher(
+    workers=HashSettings.workers, max_pending=HashSettings.max_pending, rounds=HashSettings.rounds
+)
@@ -1,20 +1,118 @@
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterable, Optional
+
+import orjson
+from fastapi import HTTPException, status
 from fastapi.encoders import jsonable_encoder
-from starlette.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.responses import Response
 
 from app.models.generic_response import GenericResponseModel
-from app.utils.logger import logger
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _encodes_as_fields(model_class: type) -> bool:
+    """Is the model's json its field dict: no alias, excluded field, json encoder or dict() override"""
+    return (
+        model_class.dict is BaseModel.dict
+        and not model_class.__config__.json_encoders
+        and all(
+            field.alias == name and field.field_info.exclude is None
+            for name, field in model_class.__fields__.items()
+        )
+    )
+
+
+def _encode_default(obj: Any) -> Any:
+    """orjson fallback: plain pydantic models are encoded from their field dict, anything else by jsonable_encoder"""
+    if isinstance(obj, BaseModel) and _encodes_as_fields(type(obj)):
+        return obj.__dict__
+    return jsonable_encoder(obj)
+
+
+def dump_json(content: Any) -> bytes:
+    """Serializes content (pydantic models included) straight to json bytes"""
+    return orjson.dumps(content, default=_encode_default)
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered by orjson without an intermediate jsonable tree"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
 
 
-def build_response_model(response_model: GenericResponseModel) -> JSONResponse:
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Does the If-None-Match header match the etag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def build_response_model(response_model: GenericResponseModel) -> FastJSONResponse:
     """Build response for controller APIs with generic response"""
     try:
-        response_json = jsonable_encoder(response_model)
-        response = JSONResponse(
-            status_code=response_model.status_code, content=response_json
+        response = FastJSONResponse(
+            status_code=response_model.status_code, content=response_model
         )
         return response
     except Exception as e:
         logger.error(e)
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=response_model.status_code, content=response_model.error
         )
+
+
+async def limit_body(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """Passes the body chunks on, 413 once more than max_bytes were read"""
+    read = 0
+    async for chunk in chunks:
+        read += len(chunk)
+        if read > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Body larger than {max_bytes} bytes"
+            )
+        yield chunk
+
+
+async def read_body(chunks: AsyncIterator[bytes], max_bytes: int) -> bytes:
+    """Whole body, 413 when larger than max_bytes"""
+    return b"".join([chunk async for chunk in limit_body(chunks, max_bytes)])
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """Non-empty lines of an NDJSON body, read chunk by chunk, 413 for a line longer than max_line_bytes"""
+    # only the unfinished line is kept, each chunk is split once
+    pending = bytearray()
+    async for chunk in chunks:
+        *lines, rest = chunk.split(b"\n")
+        if lines:
+            lines[0] = bytes(pending) + lines[0]
+            pending.clear()
+        pending += rest
+        for line in lines:
+            _check_line(line, max_line_bytes)
+            if line.strip():
+                yield line
+        _check_line(pending, max_line_bytes)
+    if pending.strip():
+        yield bytes(pending)
+
+
+def _check_line(line: bytes, max_line_bytes: int):
+    if len(line) > max_line_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Line longer than {max_line_bytes} bytes"
+        )
+
+
+async def iterate_async(items: Iterable[Any]) -> AsyncIterator[Any]:
+    """Async iterator over a plain iterable"""
+    for item in items:
+        yield item
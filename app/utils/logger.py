@@ -1,28 +1,199 @@
+import atexit
 import logging
+import queue
 import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Optional
+
+import orjson
 
 from app.utils.pathmgr import PathManager
 
+CONSOLE_FORMAT = "[%(levelname)s %(name)s %(module)s:%(lineno)s - %(funcName)s() - %(asctime)s] %(message)s"
+TIME_FORMAT = "%d.%m.%Y %I:%M:%S %p"
+
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "func": record.funcName,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry).decode()
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most burst records per call site through in each window
+
+    Dropped records are counted and the count is attached as ``suppressed`` to
+    the first record let through in the next window.
+    """
+
+    def __init__(self, burst: int, window: float, max_sites: int = 10000):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_sites = max_sites
+        self._lock = threading.Lock()
+        # call site -> [window start, records in window, suppressed]
+        self._sites: dict = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0:
+            return True
+        key = (record.pathname, record.lineno, record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site is not None else 0
+                if site is None and len(self._sites) >= self.max_sites:
+                    self._sites.clear()
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records when the queue is full instead of blocking"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merges the arguments into the message, keeping the traceback apart for the formatters"""
+        # the queue handler is the only handler, the record can be changed in place
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(QueueListener):
+    """Listener whose stop waits for room in a full queue"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def log_file_path() -> Path:
+    """Configured log file, logs/limo_log.log under the project root by default"""
+    from app.config.settings import LogSettings
+
+    return Path(LogSettings.file) if LogSettings.file else PathManager.get_log_dir().joinpath("limo_log.log")
+
+
+class LogPipeline:
+    """Records are queued by the logging thread and written by a background listener"""
+
+    def __init__(self):
+        self._listener: Optional[_QueueListener] = None
+        self._queue_handler: Optional[DroppingQueueHandler] = None
+
+    @property
+    def started(self) -> bool:
+        return self._listener is not None
+
+    def start(self):
+        """Installs the queue handler on the root logger and starts the writer thread"""
+        if self._listener is not None:
+            return
+        from app.config.settings import LogSettings
+
+        handlers = []
+        file_path = log_file_path()
+        file_handler = RotatingFileHandler(
+            file_path, maxBytes=LogSettings.max_bytes, backupCount=LogSettings.backups, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+        if LogSettings.console:
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT, TIME_FORMAT))
+            handlers.append(console_handler)
+
+        self._queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LogSettings.queue_size))
+        self._queue_handler.addFilter(RateLimitFilter(LogSettings.rate_burst, LogSettings.rate_window))
+        root = logging.getLogger()
+        root.setLevel(LogSettings.level)
+        root.addHandler(self._queue_handler)
+        for name, level in parse_levels(LogSettings.levels):
+            logging.getLogger(name).setLevel(level)
+
+        self._listener = _QueueListener(self._queue_handler.queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Writes out the queued records and stops the writer thread"""
+        if self._listener is None:
+            return
+        logging.getLogger().removeHandler(self._queue_handler)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+        atexit.unregister(self.stop)
+
+    def stats(self) -> dict:
+        """Records waiting and dropped"""
+        if self._queue_handler is None:
+            return {"queued": 0, "dropped": 0}
+        return {"queued": self._queue_handler.queue.qsize(), "dropped": self._queue_handler.dropped}
+
 
-def get_logger(name="app", level=logging.DEBUG) -> logging.Logger:
-    """Logging to logfile as well as to console"""
-    FORMAT = "[%(levelname)s  %(name)s %(module)s:%(lineno)s - %(funcName)s() - %(asctime)s]\n\t %(message)s \n"
-    TIME_FORMAT = "%d.%m.%Y %I:%M:%S %p"
-    FILENAME = PathManager.get_log_dir().joinpath("limo_log.log")
+def parse_levels(levels: str) -> list[tuple[str, str]]:
+    """(logger name, level) pairs of a "name=LEVEL,name=LEVEL" setting"""
+    pairs = []
+    for item in levels.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            pairs.append((name.strip(), level.strip().upper()))
+    return pairs
 
-    logging.basicConfig(
-        format=FORMAT
-        , datefmt=TIME_FORMAT
-        , level=level
-        , filename=FILENAME
-    )
 
-    logger_instance = logging.getLogger(name)
-    handler = logging.StreamHandler(sys.stdout)
-    logger_instance.addHandler(handler)
-    return logger_instance
+def get_logger(name="app") -> logging.Logger:
+    """Module logger, app.* loggers share the pipeline and take their level from LOG_LEVELS"""
+    return logging.getLogger(name)
 
 
-logger = get_logger(__name__)
+# started from the app lifespan or a command's main(), importing configures nothing
+log_pipeline = LogPipeline()
 
-logger.info("Limo logger initiated")
+logger = get_logger()
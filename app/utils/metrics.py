@@ -0,0 +1,183 @@
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, disable_created_metrics
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.admission import admission_control
+from app.utils.dependencies import engine_registry
+from app.utils.hashing import password_hasher
+from app.utils.post_cache import post_list_cache, user_feed_cache
+from app.utils.routing import replica_pool
+from app.utils.search_index import post_search_index
+from app.utils.token_cache import token_cache
+
+# own registry, keeps the default process/platform collectors out of /metrics
+registry = CollectorRegistry()
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    registry=registry,
+)
+requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served",
+    ["method"],
+    registry=registry,
+)
+db_statements = Counter(
+    "db_statements_total",
+    "SQL statements executed",
+    ["verb"],
+    registry=registry,
+)
+db_statement_duration = Histogram(
+    "db_statement_duration_seconds",
+    "SQL statement execution time",
+    ["verb"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    registry=registry,
+)
+db_statement_errors = Counter(
+    "db_statement_errors_total",
+    "SQL statements that raised",
+    ["verb"],
+    registry=registry,
+)
+
+
+def _statement_verb(statement: str) -> str:
+    """First keyword of the statement, bounds the label values"""
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    verb = _statement_verb(statement)
+    db_statements.labels(verb).inc()
+    db_statement_duration.labels(verb).observe(time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_started"):
+        connection.info["metrics_started"].pop()
+    db_statement_errors.labels(_statement_verb(exception_context.statement or "")).inc()
+
+
+def configure_metrics():
+    """Process wide exposition settings, applied by the app lifespan when metrics are enabled"""
+    # no *_created series next to every counter and histogram
+    disable_created_metrics()
+
+
+def instrument_engine(engine: Engine):
+    """Counts and times every statement run on the engine"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+class _PoolCollector:
+    """Connection pool utilization, read at scrape time"""
+
+    def collect(self):
+        stats = engine_registry.pool_stats()
+        yield CounterMetricFamily("db_pool_connects", "DB connections opened", value=stats["connects"])
+        yield CounterMetricFamily("db_pool_checkouts", "DB connections checked out", value=stats["checkouts"])
+        for name, help_text in (
+            ("size", "Configured pool size"),
+            ("checkedin", "Idle pooled connections"),
+            ("checkedout", "Connections in use"),
+            ("overflow", "Connections opened above the pool size"),
+        ):
+            if name in stats:
+                yield GaugeMetricFamily(f"db_pool_{name}", help_text, value=stats[name])
+
+        replicas = replica_pool.stats()
+        if replicas["replicas"]:
+            up = GaugeMetricFamily("db_replica_up", "Read replica in the rotation (1) or ejected (0)", labels=["replica"])
+            for replica, healthy in replicas["replicas"].items():
+                up.add_metric([replica], int(healthy))
+            yield up
+            yield CounterMetricFamily("db_replica_ejections", "Read replicas ejected after errors", value=replicas["ejections"])
+
+
+class _CacheCollector:
+    """Hit/miss counters of the in-process caches, read at scrape time"""
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries held", labels=["cache"])
+
+        post_list = post_list_cache.stats()
+        user_feed = user_feed_cache.stats()
+        token = token_cache.stats()
+        for cache, stats, size in (
+            ("post_list", post_list, post_list["size"]),
+            ("user_feed", user_feed, user_feed["users"]),
+            ("token", token, token["size"]),
+        ):
+            hits.add_metric([cache], stats["hits"])
+            misses.add_metric([cache], stats["misses"])
+            entries.add_metric([cache], size)
+        yield hits
+        yield misses
+        yield entries
+
+        resets = CounterMetricFamily(
+            "cache_resets", "Caches dropped whole for writes made by another worker", labels=["cache"]
+        )
+        resets.add_metric(["user_feed"], user_feed["resets"])
+        resets.add_metric(["token"], token["resets"])
+        yield resets
+
+        yield CounterMetricFamily(
+            "post_list_cache_coalesced", "Post list misses served by a load already in flight", value=post_list["coalesced"]
+        )
+        yield CounterMetricFamily(
+            "post_list_cache_evictions", "Post list pages evicted for size", value=post_list["evictions"]
+        )
+        yield GaugeMetricFamily("search_index_posts", "Posts in the search index", value=len(post_search_index))
+
+        hasher = password_hasher.stats()
+        yield GaugeMetricFamily("password_hash_pending", "Password hashes queued or running", value=hasher["pending"])
+        yield CounterMetricFamily(
+            "password_hash_rejected", "Password hashes rejected while saturated", value=hasher["rejected"]
+        )
+
+
+class _AdmissionCollector:
+    """Admission control rejections and saturation, read at scrape time"""
+
+    def collect(self):
+        stats = admission_control.stats()
+        rejected = CounterMetricFamily(
+            "admission_rejected", "Requests rejected by admission control", labels=["reason", "route_class"]
+        )
+        for (reason, route_class), count in stats["rejected"].items():
+            rejected.add_metric([reason, route_class], count)
+        yield rejected
+
+        active = GaugeMetricFamily("admission_active", "Requests holding a slot of their class", labels=["route_class"])
+        waiting = GaugeMetricFamily("admission_waiting", "Requests waiting for a slot", labels=["route_class"])
+        for route_class, count in stats["active"].items():
+            active.add_metric([route_class], count)
+            waiting.add_metric([route_class], stats["waiting"][route_class])
+        yield active
+        yield waiting
+
+
+registry.register(_PoolCollector())
+registry.register(_CacheCollector())
+registry.register(_AdmissionCollector())
@@ -0,0 +1,266 @@
+import asyncio
+import bisect
+import threading
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from cachetools import LRUCache, TTLCache
+
+from app.config.settings import CacheSettings
+from app.utils.generations import POSTS, GenerationTracker, generations
+
+_MISSING = object()
+
+
+class _CountingTTLCache(TTLCache):
+    """TTL cache counting the items evicted for size"""
+
+    def __init__(self, maxsize: int, ttl: int):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class PostListCache:
+    """Process wide cache of post list pages
+
+    Pages are keyed by the query parameters and the posts generation, which
+    every write in any worker bumps, so no page read before a write is served
+    after it. Concurrent misses for the same key share one loader call
+    (single-flight).
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._lock = threading.Lock()
+        self._cache = _CountingTTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._tracker = GenerationTracker(generations, POSTS)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def version(self) -> int:
+        """Posts generation, bumped on every write"""
+        return generations.get(POSTS)
+
+    @property
+    def epoch(self) -> str:
+        """Tells versions of different launches apart, shared by the workers of one launch"""
+        return generations.epoch
+
+    def invalidate(self):
+        """Drops every cached page, called after posts are written"""
+        with self._lock:
+            self._tracker.sync()
+            self._cache.clear()
+
+    async def get_or_load(self, params: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached page for the params, loading it once on a miss"""
+        key = (self.version, params)
+        with self._lock:
+            if self._tracker.sync():
+                # written by another worker, pages of older versions are dead weight
+                self._cache.clear()
+            value = self._cache.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # the loading request went away, load it ourselves
+                if not pending.cancelled():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as ex:
+            future.set_exception(ex)
+            # waiters re-raise it, mark it retrieved when there are none
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            with self._lock:
+                if key[0] == self.version:
+                    self._cache[key] = value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+        return value
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self._cache.evictions,
+            "size": len(self._cache),
+            "version": self.version,
+        }
+
+
+class _UserFeed:
+    """One user's posts ordered by id, with the author email for posts added in place"""
+
+    def __init__(self, posts: list, email: Optional[str]):
+        self.posts = posts
+        self.ids = [post.id for post in posts]
+        self.email = email
+
+
+class UserFeedCache:
+    """Bounded LRU of materialized per-user post lists
+
+    Only users with at most max_posts posts are materialized; bigger feeds are
+    remembered as oversized and paged from the db. Writes of this worker update
+    the cached lists in place instead of dropping them; writes of any other
+    worker, seen as a posts generation this worker did not produce, drop every
+    list. A list loaded concurrently with a write is not stored.
+    """
+
+    def __init__(self, maxsize: int, max_posts: int):
+        self._lock = threading.Lock()
+        self._feeds = LRUCache(maxsize=maxsize)
+        self._tracker = GenerationTracker(generations, POSTS)
+        self.max_posts = max_posts
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+
+    @property
+    def version(self) -> int:
+        """Posts generation, bumped on every write"""
+        return generations.get(POSTS)
+
+    def _sync(self):
+        """Drops every feed when posts were written elsewhere, called under the lock"""
+        if self._tracker.sync():
+            self._reset()
+
+    def _reset(self):
+        if self._feeds:
+            self.resets += 1
+            self._feeds.clear()
+
+    def get_page(self, user_id: int, after_id: int, limit: int) -> Optional[list]:
+        """Page of the user's posts after the cursor, None when the feed is not materialized"""
+        with self._lock:
+            self._sync()
+            feed = self._feeds.get(user_id)
+            if feed is None or feed is _OVERSIZED:
+                self.misses += 1
+                return None
+            self.hits += 1
+            start = bisect.bisect_right(feed.ids, after_id)
+            return feed.posts[start:start + limit]
+
+    def is_oversized(self, user_id: int) -> bool:
+        """True when the user has too many posts to be materialized"""
+        with self._lock:
+            self._sync()
+            return self._feeds.get(user_id) is _OVERSIZED
+
+    def fill(self, user_id: int, posts: list, version: int) -> bool:
+        """Stores the user's full post list loaded at the given version
+        :param posts: up to max_posts + 1 posts ordered by id, more than max_posts marks it oversized
+        :returns True when the list was stored
+        """
+        with self._lock:
+            self._sync()
+            if version != self.version:
+                return False
+            if len(posts) > self.max_posts:
+                self._feeds[user_id] = _OVERSIZED
+                return False
+            email = posts[0].user if posts else None
+            self._feeds[user_id] = _UserFeed(list(posts), email)
+            return True
+
+    def posts_added(self, user_id: int, posts: list, generation: int):
+        """Inserts committed posts into the user's feed if it is materialized
+        :param generation: posts generation bumped for this write
+        """
+        with self._lock:
+            if self._tracker.own_write(generation):
+                self._reset()
+                return
+            feed = self._feeds.get(user_id)
+            if feed is None or feed is _OVERSIZED:
+                return
+            if feed.email is None:
+                feed.email = next((post.user for post in posts if post.user is not None), None)
+            for post in posts:
+                if post.user is None:
+                    if feed.email is None:
+                        # author unknown, reload the feed on next read
+                        del self._feeds[user_id]
+                        return
+                    post = post.copy(update={"user": feed.email})
+                index = bisect.bisect_left(feed.ids, post.id)
+                if index < len(feed.ids) and feed.ids[index] == post.id:
+                    continue
+                feed.ids.insert(index, post.id)
+                feed.posts.insert(index, post)
+            if len(feed.ids) > self.max_posts:
+                self._feeds[user_id] = _OVERSIZED
+
+    def posts_removed(self, user_id: int, post_ids: list[int], generation: int):
+        """Drops committed deletes from the user's feed if it is materialized
+        :param generation: posts generation bumped for this write
+        """
+        with self._lock:
+            if self._tracker.own_write(generation):
+                self._reset()
+                return
+            feed = self._feeds.get(user_id)
+            if feed is None:
+                return
+            if feed is _OVERSIZED:
+                # may fit again, size it on next read
+                del self._feeds[user_id]
+                return
+            removed = set(post_ids)
+            kept = [post for post in feed.posts if post.id not in removed]
+            feed.posts = kept
+            feed.ids = [post.id for post in kept]
+
+    def clear(self):
+        """Drops every feed"""
+        with self._lock:
+            self._feeds.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and feed count"""
+        with self._lock:
+            oversized = sum(1 for feed in self._feeds.values() if feed is _OVERSIZED)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "users": len(self._feeds) - oversized,
+                "oversized": oversized,
+                "resets": self.resets,
+                "version": self.version,
+            }
+
+
+_OVERSIZED = _UserFeed([], None)
+
+post_list_cache = PostListCache(maxsize=CacheSettings.post_list_size, ttl=CacheSettings.post_list_ttl)
+user_feed_cache = UserFeedCache(maxsize=CacheSettings.user_feed_size, max_posts=CacheSettings.user_feed_max_posts)
@@ -0,0 +1,121 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config.settings import QuerySettings
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+BUDGET_ATTRIBUTE = "__query_budget__"
+
+
+def query_budget(statements: int) -> Callable:
+    """Declares the most SQL statements one request to the endpoint may issue"""
+
+    def decorator(endpoint: Callable) -> Callable:
+        setattr(endpoint, BUDGET_ATTRIBUTE, statements)
+        return endpoint
+
+    return decorator
+
+
+class RequestQueries:
+    """SQL statements issued while serving one request"""
+
+    def __init__(self, request_id: str, scope: dict):
+        self.request_id = request_id
+        # the endpoint, and with it the budget, is known once the router matched
+        self._scope = scope
+        self.count = 0
+        self.duration = 0.0
+        self.repeats: dict[str, int] = {}
+        self.over_budget = False
+
+    @property
+    def route(self) -> str:
+        return f"{self._scope['method']} {self._scope['path']}"
+
+    @property
+    def budget(self) -> int:
+        endpoint = self._scope.get("endpoint")
+        return getattr(endpoint, BUDGET_ATTRIBUTE, QuerySettings.default_budget)
+
+    def record(self, statement: str, elapsed: float):
+        """Counts one statement, reporting slow, repeated and over budget ones"""
+        self.count += 1
+        self.duration += elapsed
+
+        if elapsed * 1000 >= QuerySettings.slow_ms:
+            logger.warning(
+                f"Slow statement {elapsed * 1000:.1f}ms on {self.route} [{self.request_id}]: {statement[:500]}"
+            )
+
+        repeated = self.repeats.get(statement, 0) + 1
+        self.repeats[statement] = repeated
+        if repeated == QuerySettings.repeat_threshold + 1:
+            logger.warning(
+                f"Statement repeated more than {QuerySettings.repeat_threshold} times on {self.route} "
+                f"[{self.request_id}], likely N+1: {statement[:500]}"
+            )
+
+        budget = self.budget
+        if budget and self.count > budget and not self.over_budget:
+            self.over_budget = True
+            logger.warning(f"Query budget of {budget} exceeded on {self.route} [{self.request_id}]")
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+@contextmanager
+def untracked() -> Iterator[None]:
+    """Leaves the statements issued inside the block out of the request, for deliberate loops"""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def track_request(request_id: str, scope: dict) -> Iterator[RequestQueries]:
+    """Attributes the statements issued inside the block to the request"""
+    queries = RequestQueries(request_id, scope)
+    token = _current.set(queries)
+    try:
+        yield queries
+    finally:
+        _current.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    if queries is not None and conn.info.get("query_started"):
+        queries.record(statement, time.perf_counter() - conn.info["query_started"].pop())
+
+
+def _handle_error(exception_context):
+    # failed statements made the round trip too
+    queries = _current.get()
+    connection = exception_context.connection
+    if queries is not None and connection is not None and connection.info.get("query_started"):
+        started = connection.info["query_started"].pop()
+        queries.record(exception_context.statement or "", time.perf_counter() - started)
+
+
+def track_queries(engine: Engine):
+    """Attributes every statement run on the engine to the request issuing it"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
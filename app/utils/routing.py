@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# session.info keys
+READ_ONLY = "routing_read_only"
+PRIMARY = "routing_primary"
+REPLICA = "routing_replica"
+
+F = TypeVar("F", bound=Callable)
+
+
+def read_only(method: F) -> F:
+    """Marks a repository method that only reads, its statements may be served by a replica"""
+    method.__read_only__ = True
+    return method
+
+
+class ReplicaPool:
+    """Read replica engines handed out round-robin
+
+    A replica raising a connection error is ejected for ``eject_seconds`` and
+    then put back in the rotation, where the next failure ejects it again.
+    Replicas are assumed to lag at most ``max_lag`` seconds behind the primary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines: list[Engine] = []
+        self._ejected_until: dict[Engine, float] = {}
+        self._next = 0
+        self.eject_seconds = 30.0
+        self.max_lag = 2.0
+        self.ejections = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._engines)
+
+    @property
+    def engines(self) -> list[Engine]:
+        return list(self._engines)
+
+    def configure(self, engines: list[Engine], eject_seconds: float, max_lag: float = 2.0):
+        """Replaces the replicas, listening for their connection errors"""
+        for engine in engines:
+            event.listen(engine, "handle_error", self._on_error)
+        with self._lock:
+            self._engines = list(engines)
+            self._ejected_until.clear()
+            self._next = 0
+            self.eject_seconds = eject_seconds
+            self.max_lag = max_lag
+
+    def clear(self):
+        with self._lock:
+            self._engines = []
+            self._ejected_until.clear()
+
+    def is_healthy(self, engine: Engine) -> bool:
+        return self._ejected_until.get(engine, 0) <= time.monotonic()
+
+    def next(self) -> Optional[Engine]:
+        """Next healthy replica, None when every replica is ejected"""
+        with self._lock:
+            for _ in range(len(self._engines)):
+                engine = self._engines[self._next % len(self._engines)]
+                self._next += 1
+                if self.is_healthy(engine):
+                    return engine
+        return None
+
+    def eject(self, engine: Engine):
+        """Leaves the replica out of the rotation for eject_seconds"""
+        with self._lock:
+            if not self.is_healthy(engine):
+                return
+            self._ejected_until[engine] = time.monotonic() + self.eject_seconds
+            self.ejections += 1
+        logger.warning(f"Replica {engine.url.render_as_string()} ejected for {self.eject_seconds}s")
+
+    def _on_error(self, context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            self.eject(context.engine)
+
+    def stats(self) -> dict:
+        """Health of every replica and the ejection count"""
+        return {
+            "replicas": {engine.url.render_as_string(): self.is_healthy(engine) for engine in self._engines},
+            "ejections": self.ejections,
+        }
+
+
+class RoutingSession(Session):
+    """Session sending the statements of read only repository methods to a replica
+
+    Everything else goes to the primary, the session bind. A session that
+    flushed or issued a write stays on the primary, so a request reads its own
+    writes; reads of one session stick to one replica while it is healthy.
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        primary = super().get_bind(mapper, clause=clause, **kwargs)
+        info = self.info
+        if info.get(PRIMARY) or not replica_pool:
+            return primary
+        if self._flushing or (
+            clause is not None and (clause.is_dml or getattr(clause, "_for_update_arg", None) is not None)
+        ):
+            info[PRIMARY] = True
+            return primary
+        if not info.get(READ_ONLY):
+            return primary
+
+        replica = info.get(REPLICA)
+        if replica is None or not replica_pool.is_healthy(replica):
+            replica = replica_pool.next()
+            if replica is None:
+                return primary
+            info[REPLICA] = replica
+        return replica
+
+
+replica_pool = ReplicaPool()
@@ -0,0 +1,126 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Iterable, Optional
+
+from app.config.settings import SearchSettings
+from app.utils.generations import POSTS, GenerationTracker, generations
+
+TOKEN_PATTERN = re.compile(r"\w{2,}")
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """Lower cased word tokens of the text"""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class PostSearchIndex:
+    """In-process inverted index over post titles and descriptions
+
+    Postings map a term to the weighted term frequency per post id; title
+    terms weigh ``title_weight`` times a description term. Results are ranked
+    by tf-idf. Only ids are kept, the posts themselves are read by primary key.
+
+    Writes of this worker are indexed as they commit. Writes of other workers
+    only show as a posts generation this worker did not produce, which marks
+    the index behind until the caller catches up on the newest posts.
+    """
+
+    def __init__(self, title_weight: float):
+        self._title_weight = title_weight
+        self._lock = threading.Lock()
+        self._postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self._terms: dict[int, tuple[str, ...]] = {}
+        self._tracker = GenerationTracker(generations, POSTS)
+        self._behind = False
+        self.max_id = 0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, post_id: int, title: Optional[str], description: Optional[str]):
+        """Indexes the post, replacing an older version of it"""
+        weights = Counter()
+        for term in tokenize(title):
+            weights[term] += self._title_weight
+        for term in tokenize(description):
+            weights[term] += 1
+
+        with self._lock:
+            self._remove(post_id)
+            for term, weight in weights.items():
+                self._postings[term][post_id] = weight
+            self._terms[post_id] = tuple(weights)
+            self.max_id = max(self.max_id, post_id)
+
+    def add_many(self, posts: Iterable):
+        """Indexes posts having id, title and description"""
+        for post in posts:
+            self.add(post.id, post.title, post.description)
+
+    def remove(self, post_id: int):
+        """Drops the post from the index"""
+        with self._lock:
+            self._remove(post_id)
+
+    def _remove(self, post_id: int):
+        for term in self._terms.pop(post_id, ()):
+            postings = self._postings[term]
+            postings.pop(post_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            self.max_id = 0
+            self.ready = False
+            # rebuilt from here, so writes of other workers so far are not missing
+            self._tracker.sync()
+            self._behind = False
+
+    def posts_written(self, generation: int):
+        """Records a write of this worker already applied, with the posts generation bumped for it"""
+        if self._tracker.own_write(generation):
+            self._behind = True
+
+    def is_behind(self) -> bool:
+        """True when posts were written by another worker since the last catch up"""
+        if self._tracker.sync():
+            self._behind = True
+        return self._behind
+
+    def set_behind(self, behind: bool):
+        """Cleared before catching up, so writes made meanwhile mark the index behind again"""
+        self._behind = behind
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> tuple[int, list[int]]:
+        """Ranked post ids matching any query term
+        :returns (total matches, ids of the requested page)
+        """
+        terms = set(tokenize(query))
+        scores: dict[int, float] = defaultdict(float)
+
+        with self._lock:
+            total_docs = len(self._terms)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + total_docs / len(postings))
+                for post_id, weight in postings.items():
+                    scores[post_id] += weight * idf
+
+        # best score first, newer posts first on ties
+        page = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return len(scores), [post_id for post_id, _ in page[offset:]]
+
+    def stats(self) -> dict:
+        return {"posts": len(self._terms), "terms": len(self._postings), "max_id": self.max_id, "ready": self.ready}
+
+
+post_search_index = PostSearchIndex(title_weight=SearchSettings.title_weight)
@@ -0,0 +1,80 @@
+import hashlib
+import threading
+import time
+from typing import Optional
+
+from cachetools import TLRUCache
+
+from app.config.settings import CacheSettings
+from app.models.user_model import UserInRequestModel
+from app.utils.generations import TOKENS, GenerationTracker, generations
+
+
+class TokenCache:
+    """Process wide cache of verified access tokens
+
+    Entries are keyed by a hash of the token, never the token itself, and live
+    for the configured ttl but never past the token expiry (jwt ``exp``).
+    A logout in any worker bumps the tokens generation, which drops every
+    cached token of the other workers on their next lookup.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = TLRUCache(maxsize=maxsize, ttu=self._time_to_use, timer=time.time)
+        self._tracker = GenerationTracker(generations, TOKENS)
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        """Cache key for the token"""
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _time_to_use(self, key: str, value: tuple, now: float) -> float:
+        _, expires_at = value
+        return min(now + self._ttl, expires_at)
+
+    def get(self, token: str) -> Optional[UserInRequestModel]:
+        """Verified user for the token, if cached"""
+        with self._lock:
+            if self._tracker.sync():
+                self._reset()
+            value = self._cache.get(self.key(token))
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value[0]
+
+    def put(self, token: str, user: UserInRequestModel, expires_at: float):
+        """Caches the verified user until the token expires"""
+        with self._lock:
+            self._cache[self.key(token)] = (user, expires_at)
+
+    def evict(self, token: str):
+        """Removes the token in every worker, called once its logout is committed"""
+        generation = generations.bump(TOKENS)
+        with self._lock:
+            self._cache.pop(self.key(token), None)
+            if self._tracker.own_write(generation):
+                self._reset()
+
+    def _reset(self):
+        if self._cache:
+            self.resets += 1
+            self._cache.clear()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters"""
+        return {"hits": self.hits, "misses": self.misses, "resets": self.resets, "size": len(self._cache)}
+
+
+token_cache = TokenCache(maxsize=CacheSettings.token_size, ttl=CacheSettings.token_ttl)
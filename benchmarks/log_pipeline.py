@@ -0,0 +1,60 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+
+def time_calls(log: logging.Logger, calls: int) -> dict:
+    """Latency of logger.info calls in microseconds, as seen by the calling thread"""
+    samples = []
+    for i in range(calls):
+        started = time.perf_counter()
+        log.info(f"benchmark message {i} with some request context")
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "p50": samples[len(samples) // 2],
+        "p99": samples[int(len(samples) * 0.99)],
+        "max": samples[-1],
+    }
+
+
+def synchronous_logger(directory: str) -> logging.Logger:
+    """Previous setup: file and stdout handlers writing on the calling thread"""
+    log = logging.getLogger("bench.synchronous")
+    log.propagate = False
+    log.setLevel(logging.DEBUG)
+    file_handler = logging.FileHandler(os.path.join(directory, "synchronous.log"))
+    file_handler.setFormatter(logging.Formatter("[%(levelname)s %(name)s %(module)s:%(lineno)s] %(message)s"))
+    log.addHandler(file_handler)
+    log.addHandler(logging.StreamHandler(sys.stdout))
+    return log
+
+
+def main():
+    """Logging overhead on the calling thread: python -m benchmarks.log_pipeline > /dev/null"""
+    parser = argparse.ArgumentParser(description="Synchronous handlers against the queued log pipeline")
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synchronous = time_calls(synchronous_logger(tmp_dir), args.calls)
+
+        # every call comes from one call site, measure the pipeline without the rate limit
+        os.environ.update(LOG_RATE_BURST="0", LOG_FILE=os.path.join(tmp_dir, "queued.log"))
+        from app.utils.logger import get_logger, log_pipeline
+
+        log_pipeline.start()
+        queued = time_calls(get_logger("app.bench"), args.calls)
+        log_pipeline.stop()
+
+    for name, result in (("synchronous handlers", synchronous), ("queued pipeline", queued)):
+        sys.stderr.write(
+            f"{name:<22} p50 {result['p50']:.1f}us  p99 {result['p99']:.1f}us  max {result['max']:.1f}us\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+def run_benchmarks(extra_args: list[str], metrics: bool) -> dict:
+    """One benchmarks.run process, results keyed by scenario"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = Path(tmp_dir, "results.json")
+        command = [
+            sys.executable, "-m", "benchmarks.run",
+            # never compare with or overwrite the stored baseline
+            "--baseline", str(Path(tmp_dir, "no-baseline.json")),
+            "--output", str(output),
+            *extra_args,
+        ]
+        if not metrics:
+            command.append("--no-metrics")
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        return {result["scenario"]: result for result in json.loads(output.read_text())["results"]}
+
+
+def main():
+    """Metrics collection overhead: python -m benchmarks.metrics_overhead"""
+    parser = argparse.ArgumentParser(description="Benchmarks with and without metrics collection")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=3, help="runs with and without metrics")
+    parser.add_argument("--scenario", action="append", help="scenario to compare, repeatable")
+    args = parser.parse_args()
+    scenarios = args.scenario or ["public_root", "auth_middleware", "posts_list"]
+
+    extra_args = ["--requests", str(args.requests), "--concurrency", str(args.concurrency)]
+    for scenario in scenarios:
+        extra_args += ["--scenario", scenario]
+
+    # interleaved rounds and medians, single runs are too noisy to compare
+    runs = {False: [], True: []}
+    for _ in range(args.rounds):
+        for metrics in (False, True):
+            runs[metrics].append(run_benchmarks(extra_args, metrics))
+
+    print(f"{'scenario':<18}{'rps off':>10}{'rps on':>10}{'p50 off':>10}{'p50 on':>10}{'overhead':>10}")
+    for name in runs[False][0]:
+        rps_off, rps_on, p50_off, p50_on = (
+            statistics.median(run[name][field] for run in runs[metrics])
+            for field, metrics in (("throughput_rps", False), ("throughput_rps", True), ("p50_ms", False), ("p50_ms", True))
+        )
+        overhead = (rps_off - rps_on) / rps_off
+        print(f"{name:<18}{rps_off:>10.1f}{rps_on:>10.1f}{p50_off:>10.3f}{p50_on:>10.3f}{overhead:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_BASELINE = Path(__file__).parent.joinpath("baseline.json")
+BENCH_USER = {"username": "bench@posts.io", "password": "bench-pass"}
+
+
+def configure_env(db_path: str, bcrypt_rounds: int, metrics: bool = True, admission: bool = False,
+                  concurrency: int = 10):
+    """Points the app at a fresh SQLite stand-in, must run before importing app
+
+    Admission control is off by default: every benchmark request comes from one
+    client and would be rate limited. The hashing queue takes every concurrent
+    login, so users_token measures hashing rather than its load shedding, and
+    the app logs only to its file, stdout carries the report.
+    """
+    os.environ.update(
+        DB_DIALECT="sqlite",
+        DB_NAME=db_path,
+        DB_BOOTSTRAP="true",
+        BCRYPT_ROUNDS=str(bcrypt_rounds),
+        HASH_MAX_PENDING=str(concurrency),
+        LOG_CONSOLE="false",
+        METRICS_ENABLED=str(metrics).lower(),
+        ADMISSION_ENABLED=str(admission).lower(),
+    )
+
+
+def seed(db_path: str, users: int, posts: int):
+    """Seeds users and posts with executemany inserts"""
+    from sqlalchemy import create_engine, insert
+
+    from app.schema.bootstrap import bootstrap_schema
+    from app.schema.post import PostTable
+    from app.schema.user import UserTable
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as connection:
+        bootstrap_schema(connection)
+        connection.execute(
+            insert(UserTable),
+            [{"email": f"seed{i}@posts.io", "password": "not-a-hash"} for i in range(users)],
+        )
+        connection.execute(
+            insert(PostTable),
+            [
+                {"title": f"seeded post {i}", "description": f"description of post {i}", "user_id": i % users + 1}
+                for i in range(posts)
+            ],
+        )
+    engine.dispose()
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def measure(name: str, send, requests: int, concurrency: int, expected_status: Optional[int] = None) -> dict:
+    """Runs send(i) requests times with the given concurrency
+
+    Responses other than 2xx/3xx, or other than ``expected_status`` when given, are errors.
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await send(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if expected_status is not None:
+                failed = response.status_code != expected_status
+            else:
+                failed = response.status_code >= 400
+            if failed:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+async def run_scenarios(args) -> list[dict]:
+    """Boots app.main:app in-process and drives it through an ASGI client"""
+    import httpx
+
+    from app.main import app
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/api/v1/users/register", params=BENCH_USER)
+            response = await client.post("/api/v1/users/token", data=BENCH_USER)
+            headers = {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+            scenarios = {
+                "public_root": lambda i: client.get("/"),
+                # an unknown route behind auth: middleware cost plus a routing miss, the 404 is expected
+                "auth_middleware": (lambda i: client.get("/api/v1/bench/noop", headers=headers), 404),
+                "posts_list": lambda i: client.get("/api/v1/posts/list", headers=headers),
+                "posts_add": lambda i: client.post(
+                    "/api/v1/posts/add", headers=headers,
+                    json={"title": f"bench post {i}", "description": "added by the benchmark"},
+                ),
+                "posts_remove": lambda i: client.get(f"/api/v1/posts/remove/{i + 1}", headers=headers),
+                "users_token": lambda i: client.post("/api/v1/users/token", data=BENCH_USER),
+            }
+            for name, send in scenarios.items():
+                if args.scenario and name not in args.scenario:
+                    continue
+                send, expected_status = send if isinstance(send, tuple) else (send, None)
+                requests = args.token_requests if name == "users_token" else args.requests
+                results.append(await measure(name, send, requests, args.concurrency, expected_status))
+
+    return results
+
+
+def error_ratio(result: dict) -> float:
+    return result["errors"] / result["requests"] if result["requests"] else 0.0
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    """Regressions against the baseline beyond the threshold (0.2 = 20%), and any rise of the error rate"""
+    regressions = []
+    for result in results:
+        expected = baseline.get(result["scenario"])
+        if expected is None:
+            continue
+        error_rate, expected_error_rate = error_ratio(result), error_ratio(expected)
+        if error_rate > expected_error_rate:
+            regressions.append(
+                f"{result['scenario']}: {error_rate:.1%} errors, baseline {expected_error_rate:.1%}"
+            )
+        if result["p95_ms"] > expected["p95_ms"] * (1 + threshold):
+            regressions.append(f"{result['scenario']}: p95 {result['p95_ms']}ms, baseline {expected['p95_ms']}ms")
+        if result["throughput_rps"] < expected["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{result['scenario']}: {result['throughput_rps']} rps, baseline {expected['throughput_rps']} rps"
+            )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="In-process ASGI benchmarks on a SQLite stand-in")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--token-requests", type=int, default=50, help="requests for users_token (bcrypt bound)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=100, help="seeded users")
+    parser.add_argument("--posts", type=int, default=10000, help="seeded posts")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--scenario", action="append", help="run only this scenario, repeatable")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression ratio")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--require-baseline", action="store_true", help="fail when there is no baseline to compare with")
+    parser.add_argument("--output", type=Path, help="write the results json here as well")
+    parser.add_argument("--no-metrics", action="store_true", help="run without the metrics middleware and hooks")
+    parser.add_argument("--admission", action="store_true", help="run with admission control (rate limits apply)")
+    return parser.parse_args()
+
+
+def main():
+    """Benchmarks: python -m benchmarks.run"""
+    args = parse_args()
+    if args.require_baseline and not args.update_baseline and not args.baseline.exists():
+        sys.exit(f"No baseline at {args.baseline}, record one with --update-baseline")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        configure_env(db_path, args.bcrypt_rounds, metrics=not args.no_metrics, admission=args.admission,
+                      concurrency=args.concurrency)
+        seed(db_path, args.users, args.posts)
+        results = asyncio.run(run_scenarios(args))
+
+    report = {"results": results}
+    failed = [r["scenario"] for r in results if r["errors"]]
+    if args.update_baseline and failed:
+        print(json.dumps(report, indent=2))
+        sys.exit(f"Baseline not updated, requests failed in: {', '.join(failed)}")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps({r["scenario"]: r for r in results}, indent=2) + "\n")
+    elif args.baseline.exists():
+        report["regressions"] = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    print(output)
+    sys.exit(1 if report.get("regressions") else 0)
+
+
+if __name__ == "__main__":
+    main()
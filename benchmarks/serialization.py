@@ -0,0 +1,59 @@
+import argparse
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from app.models.generic_response import GenericResponseModel
+from app.models.post_model import ShowPostsModel
+from app.utils.helper import FastJSONResponse
+
+
+def build_model(posts: int) -> GenericResponseModel:
+    data = [
+        ShowPostsModel(id=i, title=f"post title {i}", description=f"description of post {i}", user=f"user{i}@posts.io")
+        for i in range(posts)
+    ]
+    return GenericResponseModel(data=data, message="results found", status_code=200)
+
+
+def encoder_path(model: GenericResponseModel) -> bytes:
+    """Previous path: jsonable_encoder tree, then stdlib json"""
+    return JSONResponse(status_code=model.status_code, content=jsonable_encoder(model)).body
+
+
+def fast_path(model: GenericResponseModel) -> bytes:
+    return FastJSONResponse(status_code=model.status_code, content=model).body
+
+
+def main():
+    """Response serialization micro-benchmark: python -m benchmarks.serialization"""
+    parser = argparse.ArgumentParser(description="GenericResponseModel serialization micro-benchmark")
+    parser.add_argument("--posts", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for posts in args.posts:
+        model = build_model(posts)
+        assert json.loads(encoder_path(model)) == json.loads(fast_path(model))
+
+        number = max(1, 20000 // posts)
+        timings = {}
+        for name, path in (("jsonable_encoder", encoder_path), ("fast_json", fast_path)):
+            best = min(timeit.repeat(lambda: path(model), number=number, repeat=args.repeat))
+            timings[name] = round(best / number * 1000, 4)
+
+        results.append({
+            "posts": posts,
+            "jsonable_encoder_ms": timings["jsonable_encoder"],
+            "fast_json_ms": timings["fast_json"],
+            "speedup": round(timings["jsonable_encoder"] / timings["fast_json"], 1),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
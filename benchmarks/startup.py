@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.run import configure_env, seed
+
+# imported in this order, so every step only pays for what earlier steps did not load
+IMPORT_STEPS = [
+    ("framework", ["fastapi", "starlette.responses", "pydantic"]),
+    ("sqlalchemy", ["sqlalchemy", "sqlalchemy.orm", "sqlalchemy.ext.asyncio"]),
+    ("settings", ["app.config.settings"]),
+    ("logging", ["app.utils.logger"]),
+    ("db", ["app.utils.dependencies", "app.schema.user", "app.schema.post", "app.schema.user_token"]),
+    ("hashing", ["app.utils.hashing"]),
+    ("caches", ["app.utils.post_cache", "app.utils.token_cache", "app.utils.search_index"]),
+    ("repositories", ["app.repositories.post_repository", "app.repositories.user_repository"]),
+    ("services", ["app.services.post_service", "app.services.user_service", "app.services.token_sweeper"]),
+    ("metrics", ["app.utils.metrics", "app.utils.query_tracker"]),
+    ("controllers", ["app.controllers.post_controller", "app.controllers.user_controller"]),
+    ("app", ["app.main"]),
+]
+
+
+def time_imports() -> dict:
+    """Seconds spent importing each subsystem"""
+    timings = {}
+    for step, modules in IMPORT_STEPS:
+        started = time.perf_counter()
+        for module in modules:
+            importlib.import_module(module)
+        timings[step] = time.perf_counter() - started
+    return timings
+
+
+async def time_startup() -> dict:
+    """Warm-up step durations recorded by the lifespan, and the first request after it"""
+    import httpx
+
+    from app.main import app
+
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        lifespan = time.perf_counter() - started
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            started = time.perf_counter()
+            response = await client.get("/health/ready")
+            first_request = time.perf_counter() - started
+        return {
+            "warm_up": dict(app.state.startup_timings),
+            "lifespan": lifespan,
+            "first_request": first_request,
+            "ready_status": response.status_code,
+        }
+
+
+def seed_in_subprocess(db_path: str, users: int, posts: int):
+    """Seeds from another interpreter, keeping app modules out of this one until they are timed"""
+    code = f"from benchmarks.run import seed; seed({db_path!r}, {users}, {posts})"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def rounded(timings: dict) -> dict:
+    return {step: round(seconds * 1000, 2) for step, seconds in timings.items()}
+
+
+def main():
+    """Import and warm-up time per subsystem: python -m benchmarks.startup"""
+    parser = argparse.ArgumentParser(description="Import and warm-up time per subsystem")
+    parser.add_argument("--use-env", action="store_true", help="start against the configured database")
+    parser.add_argument("--users", type=int, default=100, help="seeded users")
+    parser.add_argument("--posts", type=int, default=10000, help="seeded posts")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--output", type=Path, help="write the report json here as well")
+    args = parser.parse_args()
+
+    if any(module.startswith("app") for module in sys.modules):
+        sys.exit("app was imported before timing started")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if not args.use_env:
+            db_path = os.path.join(tmp_dir, "startup.db")
+            configure_env(db_path, args.bcrypt_rounds)
+            os.environ["LOG_FILE"] = os.path.join(tmp_dir, "startup.log")
+            seed_in_subprocess(db_path, args.users, args.posts)
+
+        imports = time_imports()
+        startup = asyncio.run(time_startup())
+
+    report = {
+        "import_ms": rounded(imports),
+        "import_total_ms": round(sum(imports.values()) * 1000, 2),
+        "warm_up_ms": rounded(startup["warm_up"]),
+        "lifespan_ms": round(startup["lifespan"] * 1000, 2),
+        "first_request_ms": round(startup["first_request"] * 1000, 2),
+        "ready_status": startup["ready_status"],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
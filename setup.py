@@ -11,6 +11,7 @@ setup(
         "app.schema",
         "app.services",
         "app.controllers",
+        "app.middlewares",
         "app.repositories",
     ],
     url="https://www.vibeosys.com",
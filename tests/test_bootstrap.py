@@ -0,0 +1,32 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+
+from app.schema.bootstrap import bootstrap_schema
+
+
+def memory_engine():
+    return create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+
+def test_bootstrap_is_idempotent():
+    engine = memory_engine()
+    with engine.begin() as connection:
+        bootstrap_schema(connection)
+        assert bootstrap_schema(connection) == []
+    engine.dispose()
+
+
+def test_plain_index_does_not_cover_a_unique_one():
+    engine = memory_engine()
+    with engine.begin() as connection:
+        bootstrap_schema(connection)
+        connection.execute(text("DROP INDEX ix_user_tokens_username"))
+        connection.execute(text("CREATE INDEX ix_user_tokens_username ON user_tokens (username)"))
+        connection.execute(text("CREATE INDEX ix_tokens_by_username ON user_tokens (username)"))
+
+        created = bootstrap_schema(connection)
+        indexes = {ix["name"]: ix for ix in inspect(connection).get_indexes("user_tokens")}
+    engine.dispose()
+
+    assert created == ["ix_user_tokens_username"]
+    assert indexes["ix_user_tokens_username"]["unique"]
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.helper import iter_ndjson_lines, limit_body, read_body
+
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def ndjson_lines(body: bytes, size: int, max_line_bytes: int) -> list[bytes]:
+    async def collect():
+        return [line async for line in iter_ndjson_lines(chunked(body, size), max_line_bytes)]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_lines_split_across_chunks(size):
+    body = b'{"title": "first"}\n\n  \n{"title": "second"}\n{"title": "last"}'
+
+    assert ndjson_lines(body, size, 100) == [b'{"title": "first"}', b'{"title": "second"}', b'{"title": "last"}']
+
+
+@pytest.mark.parametrize("body", [b"x" * 101, b"short\n" + b"x" * 101 + b"\nshort"])
+def test_line_longer_than_the_limit_is_rejected(body):
+    with pytest.raises(HTTPException) as raised:
+        ndjson_lines(body, 10, 100)
+
+    assert raised.value.status_code == 413
+
+
+def test_body_larger_than_the_limit_is_rejected():
+    assert asyncio.run(read_body(chunked(b"x" * 100, 10), 100)) == b"x" * 100
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(read_body(chunked(b"x" * 101, 10), 100))
+
+    assert raised.value.status_code == 413
+
+
+def test_limited_stream_stops_at_the_limit():
+    read = []
+
+    async def consume():
+        async for chunk in limit_body(chunked(b"x" * 1000, 10), 100):
+            read.append(chunk)
+
+    with pytest.raises(HTTPException):
+        asyncio.run(consume())
+    assert sum(map(len, read)) == 100
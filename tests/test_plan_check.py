@@ -0,0 +1,29 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.schema.bootstrap import bootstrap_schema
+from app.schema.plan_check import find_full_scans
+
+
+def full_scans(*statements: str) -> list:
+    """Full table scans of the repository statements on a bootstrapped schema changed by the statements"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as connection:
+        bootstrap_schema(connection)
+        for statement in statements:
+            connection.execute(text(statement))
+
+    failures = find_full_scans(engine)
+    engine.dispose()
+    return failures
+
+
+def test_repository_statements_scan_no_table():
+    assert full_scans() == []
+
+
+def test_missing_index_is_reported():
+    failures = full_scans("DROP INDEX ix_user_tokens_expiry_time")
+
+    assert failures
+    assert all("user_tokens" in statement for statement, _ in failures)
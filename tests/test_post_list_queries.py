@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.repositories.post_repository import PostRepository
+from app.schema.bootstrap import bootstrap_schema
+from app.schema.post import PostTable
+from app.schema.user import UserTable
+
+
+def seed_engine(posts: int):
+    """In-memory SQLite with one author per post"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as connection:
+        bootstrap_schema(connection)
+        connection.execute(
+            insert(UserTable), [{"email": f"author{i}@posts.io", "password": "hash"} for i in range(posts)]
+        )
+        connection.execute(
+            insert(PostTable),
+            [{"title": f"post {i}", "description": "post", "user_id": i + 1} for i in range(posts)],
+        )
+    return engine
+
+
+def count_list_statements(posts: int) -> int:
+    """Statements issued by get_list reading every post"""
+    engine = seed_engine(posts)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with Session(engine) as session:
+        listed = PostRepository(session).get_list(limit=posts)
+    engine.dispose()
+
+    assert len(listed) == posts
+    assert {post.user for post in listed} == {f"author{i}@posts.io" for i in range(posts)}
+    return len(statements)
+
+
+@pytest.mark.parametrize("posts", [10, 100])
+def test_list_statement_count_does_not_grow_with_posts(posts):
+    assert count_list_statements(posts) == count_list_statements(1)
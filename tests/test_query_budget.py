@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.middlewares.query_tracking import QueryTrackingMiddleware
+from app.utils import query_tracker
+from app.utils.query_tracker import query_budget, track_queries
+
+engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+track_queries(engine)
+
+
+def run_statements(count: int):
+    with engine.connect() as connection:
+        for _ in range(count):
+            connection.execute(text("SELECT 1"))
+
+
+@query_budget(1)
+async def within_budget(request):
+    run_statements(1)
+    return PlainTextResponse("ok")
+
+
+@query_budget(1)
+async def over_budget(request):
+    run_statements(2)
+    return PlainTextResponse("ok")
+
+
+def get(strict: bool, *paths: str) -> list[httpx.Response]:
+    app = Starlette(routes=[Route("/within", within_budget), Route("/over", over_budget)])
+    app.add_middleware(QueryTrackingMiddleware, strict=strict)
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return [await client.get(path) for path in paths]
+
+    return asyncio.run(send())
+
+
+def test_strict_mode_fails_a_request_over_budget():
+    response, = get(True, "/over")
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Query budget of 1 exceeded: 2 statements"}
+
+
+def test_request_over_budget_is_only_logged_without_strict_mode(caplog):
+    with caplog.at_level(logging.WARNING, logger=query_tracker.__name__):
+        response, = get(False, "/over")
+
+    assert response.status_code == 200
+    assert response.headers["X-Query-Count"] == "2"
+    assert [record.getMessage() for record in caplog.records] == [
+        f"Query budget of 1 exceeded on GET /over [{response.headers['X-Request-ID']}]"
+    ]
+
+
+@pytest.mark.parametrize("strict", [True, False])
+def test_budget_does_not_leak_into_the_next_request(strict, caplog):
+    with caplog.at_level(logging.WARNING, logger=query_tracker.__name__):
+        over, within = get(strict, "/over", "/within")
+
+    assert within.status_code == 200
+    assert within.headers["X-Query-Count"] == "1"
+    assert over.headers["X-Request-ID"] != within.headers["X-Request-ID"]
+    assert len(caplog.records) == 1
+    assert query_tracker._current.get() is None
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, insert
+
+from app.models.post_model import AddPostModel
+from app.repositories.post_repository import PostRepository
+from app.repositories.user_repository import UserRepository
+from app.schema.bootstrap import bootstrap_schema
+from app.schema.post import PostTable
+from app.schema.user import UserTable
+from app.utils.generations import POSTS, generations
+from app.utils.routing import RoutingSession, replica_pool
+
+
+def seed_engine(path, title: str):
+    """SQLite file with one user and one post titled after the database"""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        bootstrap_schema(connection)
+        connection.execute(insert(UserTable), [{"email": "reader@posts.io", "password": "hash"}])
+        connection.execute(insert(PostTable), [{"title": title, "description": "post", "user_id": 1}])
+    return engine
+
+
+@pytest.fixture
+def engines(tmp_path):
+    primary = seed_engine(tmp_path / "primary.db", "on the primary")
+    replica = seed_engine(tmp_path / "replica.db", "on the replica")
+    # a directory that does not exist, connecting raises OperationalError
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    yield primary, replica, broken
+    replica_pool.clear()
+    for engine in (primary, replica, broken):
+        engine.dispose()
+
+
+def run(method, *args):
+    return asyncio.run(method.__self__.run(method, *args))
+
+
+def titles(primary) -> list[str]:
+    with RoutingSession(bind=primary) as session:
+        return [post.title for post in run(PostRepository(session).get_list)]
+
+
+def test_read_only_methods_go_to_a_replica(engines):
+    primary, replica, _ = engines
+    replica_pool.configure([replica], eject_seconds=30, max_lag=0)
+
+    assert titles(primary) == ["on the replica"]
+
+
+def test_without_replicas_reads_go_to_the_primary(engines):
+    primary, _, _ = engines
+
+    assert titles(primary) == ["on the primary"]
+
+
+def test_reads_after_a_write_stay_on_the_primary(engines):
+    primary, replica, _ = engines
+    replica_pool.configure([replica], eject_seconds=30, max_lag=0)
+
+    with RoutingSession(bind=primary) as session:
+        repo = PostRepository(session)
+        run(repo.add_post, AddPostModel(title="added post", description="post"), 1)
+        listed = [post.title for post in run(repo.get_list)]
+
+    assert listed == ["on the primary", "added post"]
+
+
+def test_failing_replica_is_ejected_and_the_read_retried(engines):
+    primary, replica, broken = engines
+    replica_pool.configure([broken, replica], eject_seconds=30, max_lag=0)
+    ejections = replica_pool.ejections
+
+    assert titles(primary) == ["on the replica"]
+    assert not replica_pool.is_healthy(broken)
+    assert replica_pool.is_healthy(replica)
+    assert replica_pool.ejections == ejections + 1
+    # left out of the rotation, no more failed reads
+    assert titles(primary) == ["on the replica"]
+    assert replica_pool.ejections == ejections + 1
+
+
+def test_read_falls_back_to_the_primary_when_every_replica_fails(engines):
+    primary, _, broken = engines
+    replica_pool.configure([broken], eject_seconds=30, max_lag=0)
+
+    assert titles(primary) == ["on the primary"]
+    assert replica_pool.next() is None
+
+
+@pytest.mark.parametrize("max_lag, expected", [(60, "on the primary"), (0, "on the replica")])
+def test_reads_go_to_the_primary_within_the_replica_lag_of_a_write(engines, max_lag, expected):
+    primary, replica, _ = engines
+    replica_pool.configure([replica], eject_seconds=30, max_lag=max_lag)
+    generations.bump(POSTS)
+
+    with RoutingSession(bind=primary) as session:
+        repo = PostRepository(session)
+        assert repo.use_primary_after_write(POSTS) == (max_lag > 0)
+        assert [post.title for post in run(repo.get_list)] == [expected]
+
+
+def test_session_missing_on_the_replica_is_looked_up_on_the_primary(engines):
+    primary, replica, _ = engines
+    replica_pool.configure([replica], eject_seconds=30, max_lag=0)
+    with RoutingSession(bind=primary) as session:
+        repo = UserRepository(session)
+        token = run(repo.start_session, 1, "reader@posts.io")
+
+    with RoutingSession(bind=primary) as session:
+        user = run(UserRepository(session).authenticate, token)
+
+    assert user.username == "reader@posts.io"
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import orjson
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+
+from app.models.generic_response import GenericResponseModel, PagedResponseModel
+from app.models.post_model import BulkPostErrorModel, BulkPostResultModel, SearchPostsResultModel, ShowPostsModel
+from app.models.token_model import Token
+from app.models.user_model import ActiveSessionModel
+from app.utils.helper import dump_json
+
+
+class AliasedModel(BaseModel):
+    post_id: int = Field(alias="postId")
+    secret: str = Field(default="hidden", exclude=True)
+
+    class Config:
+        allow_population_by_field_name = True
+
+
+class EncodedModel(BaseModel):
+    created: datetime
+
+    class Config:
+        json_encoders = {datetime: lambda value: value.strftime("%d.%m.%Y")}
+
+
+POSTS = [
+    ShowPostsModel.construct(id=i, title=f"post {i}", description=None, user=f"user{i}@posts.io") for i in range(3)
+]
+
+RESPONSES = [
+    GenericResponseModel(data=POSTS, message="results found", status_code=200),
+    PagedResponseModel(data=POSTS, message="results found", status_code=200, next_cursor=2),
+    GenericResponseModel(data=Token(access_token="token", token_type="bearer"), status_code=200),
+    GenericResponseModel(data=SearchPostsResultModel.construct(total=3, posts=POSTS), status_code=200),
+    GenericResponseModel(
+        data=BulkPostResultModel(inserted=1, failed=[BulkPostErrorModel(index=0, error="invalid")]), status_code=201
+    ),
+    GenericResponseModel(
+        data=ActiveSessionModel(user_id=1, username="u@posts.io", access_token="token",
+                                expiry_time=datetime(2026, 1, 2, 3, 4, 5, 678000)),
+    ),
+    GenericResponseModel(data=[AliasedModel(post_id=1)], status_code=200),
+    # json_encoders of nested models are not applied by jsonable_encoder either, only at the top
+    EncodedModel(created=datetime(2026, 1, 2)),
+]
+
+
+@pytest.mark.parametrize("model", RESPONSES)
+def test_dump_json_matches_jsonable_encoder(model):
+    assert orjson.loads(dump_json(model)) == jsonable_encoder(model)